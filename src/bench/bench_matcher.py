@@ -0,0 +1,53 @@
+# naive `egg in text` loop (what EasterEggs used to do) vs NzKeywordMatcher
+# run from src/: python -m bench.bench_matcher [keywords] [message length] [messages]
+import random
+import string
+import sys
+import time
+from nz_matcher import NzKeywordMatcher
+
+
+def naive(keywords, text):
+    return {k for k in keywords if k in text}
+
+
+def main(n_keywords, length, n_messages):
+    rng = random.Random(727)
+    letters = string.ascii_lowercase + "     "
+    keywords = {"".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 12))) for _ in range(n_keywords)}
+    pool = list(keywords)
+    messages = []
+    for _ in range(n_messages):
+        words = rng.choices(letters, k=length)
+        # sprinkle a few real keywords in so there's something to find
+        for _ in range(3):
+            kw = rng.choice(pool)
+            at = rng.randrange(max(1, length - len(kw)))
+            words[at:at + len(kw)] = kw
+        messages.append("".join(words))
+
+    start = time.perf_counter()
+    matcher = NzKeywordMatcher(keywords, scan_limit=0)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [naive(keywords, m) for m in messages]
+    naive_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    got = [matcher.find(m) for m in messages]
+    matcher_time = time.perf_counter() - start
+
+    assert got == expected, "matcher disagrees with the naive scan"
+    print(f"{len(keywords)} keywords, {n_messages} messages of {length} chars")
+    print(f"build      {build * 1000:9.2f} ms")
+    print(f"naive      {naive_time / n_messages * 1e6:9.1f} us/msg")
+    print(f"automaton  {matcher_time / n_messages * 1e6:9.1f} us/msg")
+    print(f"speedup    {naive_time / matcher_time:9.1f}x")
+
+
+if __name__ == "__main__":
+    n_keywords = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    length = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    n_messages = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    main(n_keywords, length, n_messages)
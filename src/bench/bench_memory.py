@@ -0,0 +1,114 @@
+# resident memory of discord.py's caches under each cache profile (config.cache_profile)
+# every profile runs in its own process, fed the same synthetic gateway traffic
+# (only the events its intents would actually get) through discord.py's own parsers
+# run from src/: python -m bench.bench_memory [guilds] [messages]
+import gc
+import resource
+import subprocess
+import sys
+import config
+from nz_cache_profile import PROFILES, cache_options
+from nz_extensions import discover
+
+CHANNELS = 40
+ROLES = 30
+EMOJIS = 50
+MEMBERS = 500      # per guild, what chunking would cache with the members intent
+VOICE = 20         # members in voice per guild
+WORDS = "the quick brown fox jumps over the lazy dog and keeps going for a while "
+
+
+def rss_kib():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    # peak rather than current, still good enough to compare
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def user(user_id):
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0",
+            "global_name": None, "avatar": None}
+
+
+def member(user_id):
+    return {"user": user(user_id), "roles": [], "joined_at": "2024-01-01T00:00:00+00:00",
+            "deaf": False, "mute": False, "flags": 0}
+
+
+def guild_payload(guild_id, intents):
+    base = guild_id * 100_000
+    users = range(base + 1000, base + 1000 + MEMBERS)
+    return {
+        "id": str(guild_id), "name": f"guild {guild_id}", "owner_id": str(base + 1000),
+        "member_count": MEMBERS, "large": MEMBERS > 250, "features": [], "threads": [],
+        "stickers": [], "presences": [],
+        "roles": [{"id": str(guild_id if i == 0 else base + 1 + i), "name": f"role{i}", "color": 0,
+                   "hoist": False, "position": i, "permissions": "0", "managed": False,
+                   "mentionable": False, "flags": 0} for i in range(ROLES)],
+        "channels": [{"id": str(base + 100 + i), "type": 0, "name": f"channel{i}", "position": i,
+                      "permission_overwrites": [], "nsfw": False, "guild_id": str(guild_id)}
+                     for i in range(CHANNELS)],
+        "emojis": [{"id": str(base + 500 + i), "name": f"emoji{i}", "roles": [], "require_colons": True,
+                    "managed": False, "animated": False, "available": True} for i in range(EMOJIS)],
+        # with the members intent discord.py chunks every guild, without it a
+        # large guild comes with next to nobody
+        "members": [member(u) for u in users] if intents.members else [member(users[0])],
+        "voice_states": [{"user_id": str(u), "channel_id": str(base + 100), "session_id": "x",
+                          "deaf": False, "mute": False, "self_deaf": False, "self_mute": False,
+                          "self_video": False, "suppress": False, "request_to_speak_timestamp": None}
+                         for u in users[:VOICE]] if intents.voice_states else [],
+    }
+
+
+def message_payload(message_id, guild_id, intents):
+    base = guild_id * 100_000
+    author = base + 1000 + message_id % MEMBERS
+    return {
+        "id": str(message_id), "channel_id": str(base + 100 + message_id % CHANNELS), "guild_id": str(guild_id),
+        "author": user(author), "member": {k: v for k, v in member(author).items() if k != "user"},
+        "content": WORDS * 2 if intents.message_content else "", "timestamp": "2024-01-01T00:00:00+00:00",
+        "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": [],
+        "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0,
+    }
+
+
+def child(profile, guilds, messages):
+    from discord.state import ConnectionState
+    options = cache_options(profile, discover([config.cog_folder, config.event_folder]))
+    state = ConnectionState(dispatch=lambda *args, **kwargs: None, handlers={}, hooks={}, http=None,
+                            chunk_guilds_at_startup=False, **{k: v for k, v in options.items()
+                                                               if k != "chunk_guilds_at_startup"})
+    intents = state._intents
+    gc.collect()
+    before = rss_kib()
+    for g in range(1, guilds + 1):
+        state.parse_guild_create(guild_payload(g, intents))
+    if intents.guild_messages:
+        for m in range(messages):
+            state.parse_message_create(message_payload(10 ** 9 + m, m % guilds + 1, intents))
+    gc.collect()
+    after = rss_kib()
+    members = sum(len(g._members) for g in state.guilds)
+    cached = len(state._messages) if state._messages is not None else 0
+    print(f"{profile:<8} {after - before:>8} KiB  {members:>7} members  {cached:>5} messages  "
+          f"{len(state._emojis):>6} emojis  intents {intents.value}")
+
+
+def main(guilds, messages):
+    print(f"{guilds} guilds, {messages} messages")
+    for profile in PROFILES:
+        subprocess.run([sys.executable, "-m", "bench.bench_memory", "--child", profile, str(guilds), str(messages)],
+                       check=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 50,
+             int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
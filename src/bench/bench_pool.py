@@ -0,0 +1,58 @@
+# queries per second with a connection per query (how nz_database used to work)
+# vs the shared NzPool
+# run from src/: python -m bench.bench_pool [queries] [concurrency]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import aiosqlite
+from nz_database import NzDatabase
+from nz_pool import NzPool
+
+
+async def get_credits_unpooled(path, user_id):
+    async with aiosqlite.connect(path) as db:
+        cursor = await db.execute(
+            "SELECT credits FROM SocialCredits WHERE user_id=?", (user_id,)
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
+
+async def run(label, fn, queries, concurrency):
+    per_worker = queries // concurrency
+
+    async def worker(offset):
+        for i in range(per_worker):
+            await fn((offset + i) % 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w * per_worker) for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    total = per_worker * concurrency
+    print(f"{label:<12} {total:>7} queries  {elapsed:7.3f}s  {total / elapsed:10.1f} q/s")
+    return total / elapsed
+
+
+async def main(queries, concurrency):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    pool = NzPool(path)
+    await pool.open()
+    db = NzDatabase(pool)
+    await db.init_tables()
+    await pool.executemany(
+        "INSERT INTO SocialCredits(user_id, credits) VALUES (?, ?)",
+        [(i, i * 3) for i in range(1000)]
+    )
+
+    before = await run("unpooled", lambda uid: get_credits_unpooled(path, uid), queries, concurrency)
+    after = await run("pooled", db.get_credits, queries, concurrency)
+    print(f"speedup      {after / before:.1f}x")
+    await pool.close()
+
+
+if __name__ == "__main__":
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    asyncio.run(main(queries, concurrency))
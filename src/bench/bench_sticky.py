@@ -0,0 +1,46 @@
+# REST calls and db writes per sticky repost
+# run from src/: python -m bench.bench_sticky [messages] [channels]
+import asyncio
+import sys
+import config
+from events.sticky_event import NzStickyHandler
+from bench.fakes import CountingStickyDb, FakeBot, FakeChannel, FakeMessage, Rest
+
+
+async def scenario(label, messages, channels, quiet_period, checkpoint_interval):
+    config.sticky_quiet_period = quiet_period
+    config.sticky_max_delay = quiet_period * 10
+    config.sticky_checkpoint_interval = checkpoint_interval
+    config.sticky_rate = 10 ** 9  # measuring cost per repost, not the throttle
+    rest = Rest()
+    db = CountingStickyDb()
+    bot = FakeBot(db)
+    handler = NzStickyHandler(bot, db)
+    await handler.cog_load()
+    chans = [FakeChannel(rest) for _ in range(channels)]
+    for ch in chans:
+        handler.sticky_cache[ch.id] = {"content": "sticky", "message_id": None, "last_msg_id": None}
+
+    for i in range(messages):
+        bot.dispatcher.dispatch(FakeMessage(chans[i % channels], "hello"))
+        await asyncio.sleep(0)  # messages come in one gateway event at a time
+    # let the debounced reposts fire
+    await asyncio.sleep(config.sticky_max_delay + 0.05)
+    await handler.cog_unload()
+
+    reposts = rest.calls["POST message"]
+    print(f"{label:<28} {messages:>5} msgs  {reposts:>5} reposts  "
+          f"{rest.total / max(reposts, 1):4.2f} REST/repost  "
+          f"{db.writes / max(reposts, 1):4.2f} db writes/repost  "
+          f"{rest.total / messages:4.2f} REST/msg  {dict(rest.calls)}")
+
+
+async def main(messages, channels):
+    await scenario("every message, write-through", messages, channels, 0, 0)
+    await scenario("debounced, lazy checkpoint", messages, channels, 0.05, 60)
+
+
+if __name__ == "__main__":
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    channels = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    asyncio.run(main(messages, channels))
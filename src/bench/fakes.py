@@ -0,0 +1,122 @@
+# stand-ins for the bits of discord.py the listeners touch, every REST call is
+# counted in a shared Rest object instead of going anywhere
+import itertools
+from collections import Counter
+
+_ids = itertools.count(1_000_000_000_000_000_000)
+
+
+def next_id():
+    return next(_ids)
+
+
+class Rest:
+    def __init__(self):
+        self.calls = Counter()
+
+    def hit(self, route):
+        self.calls[route] += 1
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+    def reset(self):
+        self.calls.clear()
+
+
+class FakeAuthor:
+    def __init__(self, id=None, name="user", bot=False):
+        self.id = id or next_id()
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+
+    def __str__(self):
+        return self.name
+
+
+class FakePartialMessage:
+    def __init__(self, channel, id):
+        self.channel = channel
+        self.id = id
+
+    async def delete(self):
+        self.channel.rest.hit("DELETE message")
+
+    async def edit(self, content=None, **kwargs):
+        self.channel.rest.hit("PATCH message")
+        return FakeMessage(self.channel, content, id=self.id)
+
+
+class FakeMessage(FakePartialMessage):
+    def __init__(self, channel, content, author=None, id=None, guild=None, attachments=()):
+        super().__init__(channel, id or next_id())
+        self.content = content
+        self.author = author or FakeAuthor()
+        self.guild = guild if guild is not None else channel.guild
+        self.attachments = list(attachments)
+
+    async def reply(self, content, **kwargs):
+        return await self.channel.send(content)
+
+
+class FakeGuild:
+    def __init__(self, id=None):
+        self.id = id or next_id()
+
+
+class FakeChannel:
+    def __init__(self, rest, id=None, guild=None):
+        self.rest = rest
+        self.id = id or next_id()
+        self.guild = guild
+
+    async def fetch_message(self, id):
+        self.rest.hit("GET message")
+        return FakeMessage(self, "", id=id)
+
+    def get_partial_message(self, id):
+        return FakePartialMessage(self, id)
+
+    async def send(self, content=None, **kwargs):
+        self.rest.hit("POST message")
+        return FakeMessage(self, content, author=FakeAuthor(name="nazareth", bot=True))
+
+
+class FakeBot:
+    """Just enough of Nazareth for cogs to register with a real dispatcher"""
+
+    def __init__(self, sticky_db=None, **attrs):
+        from nz_dispatcher import NzDispatcher
+        from nz_guild_settings import NzGuildSettings
+        from nz_metrics import NzMetrics
+        self.command_prefix = "~"
+        self.rest = Rest()
+        self.sticky_db = sticky_db or CountingStickyDb()
+        self.settings = NzGuildSettings(None)  # empty index, nothing switched off
+        self.metrics = NzMetrics()
+        self.__dict__.update(attrs)
+        self.dispatcher = NzDispatcher(self)
+
+    def get_partial_messageable(self, id, **kwargs):
+        return FakeChannel(self.rest, id=id)
+
+    async def on_error(self, event, *args):
+        import traceback
+        traceback.print_exc()
+
+
+class CountingStickyDb:
+    """NzStickyDb without the database, counts the writes"""
+
+    def __init__(self):
+        self.cache = {}
+        self.writes = 0
+
+    async def set_message_id(self, channel_id, message_id):
+        self.writes += 1
+
+    async def set_message_ids(self, rows):
+        if rows:
+            self.writes += 1
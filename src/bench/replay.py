@@ -0,0 +1,269 @@
+# replays a message stream through the real listeners, with stand-in channels
+# (bench/fakes.py) and a throwaway database instead of discord. Per scenario:
+# throughput, p50/p99 per handler, REST calls per message and commits per message
+# run from src/: python -m bench.replay [--messages N] [--scenario NAME ...]
+#   --record logs/nazareth.jsonl  replays what MessageLogger recorded instead of a synthetic stream
+#   --db nazareth.db              starts from a copy of a real database (stickies, eggs, settings)
+#   --rate 50                     paces the stream at 50 msgs/s, flat out by default (which
+#                                 lets the debouncing listeners coalesce far more than they would live)
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import config
+from bench.fakes import FakeAuthor, FakeBot, FakeChannel, FakeGuild, FakeMessage
+from nz_database import NzDatabase
+from nz_dm_archive import NzDmArchive
+from nz_egg_store import NzEggStore
+from nz_guild_settings import NzGuildSettings
+from nz_logging import setup_logging
+from nz_pool import NzPool
+from nz_sticky_db import NzStickyDb
+
+SCENARIOS = ("eggs", "sticky", "dm", "logger", "all", "database")
+WORDS = ("hello", "what", "is", "this", "lol", "anyway", "osu", "tomorrow", "based", "ok", "no", "maybe")
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def build_bot(workdir, source_db=None):
+    path = os.path.join(workdir, "replay.db")
+    if source_db:
+        shutil.copy(source_db, path)
+    pool = NzPool(path, checkpoint_interval=0)
+    await pool.open()
+    db = NzDatabase(pool, write_interval=config.db_write_interval)
+    await db.start()
+    sticky_db = NzStickyDb(pool)
+    await sticky_db.load()
+    settings = NzGuildSettings(pool)
+    await settings.load(config.brainrot_channels)
+    from cogs.easter_eggs import eggs_basket
+    egg_store = NzEggStore(pool)
+    await egg_store.load(eggs_basket)
+    dm_archive = NzDmArchive(pool, batch_size=config.dm_archive_batch, interval=config.dm_archive_interval)
+    await dm_archive.start()
+    return FakeBot(
+        sticky_db, pool=pool, db=db, settings=settings, egg_store=egg_store, dm_archive=dm_archive
+    )
+
+
+async def synthetic(bot, count, seed=0):
+    """A day in a small server: mostly chatter, some brainrot, stickies and DMs"""
+    rng = random.Random(seed)
+    guild = FakeGuild()
+    rest = bot.rest
+    plain = [FakeChannel(rest, guild=guild) for _ in range(8)]
+    brainrot = [FakeChannel(rest, guild=guild) for _ in range(2)]
+    sticky = [FakeChannel(rest, guild=guild) for _ in range(2)]
+    for ch in brainrot:
+        await bot.settings.set_channel("brainrot", guild.id, ch.id, True)
+    for ch in sticky:
+        await bot.sticky_db.add_channel(ch.id, "read the rules")
+    authors = [FakeAuthor(name=f"user{i}") for i in range(50)]
+    dms = {author.id: FakeChannel(rest) for author in authors[:10]}
+    triggers = list(bot.egg_store.baskets.get(0, {})) or ["osu"]
+
+    messages = []
+    for _ in range(count):
+        author = rng.choice(authors)
+        text = " ".join(rng.choices(WORDS, k=rng.randint(2, 12)))
+        roll = rng.random()
+        if roll < 0.6:
+            channel = rng.choice(plain)
+        elif roll < 0.8:
+            channel = rng.choice(brainrot)
+            if rng.random() < 0.3:
+                text += " " + rng.choice(triggers)
+        elif roll < 0.9:
+            channel = rng.choice(sticky)
+        else:
+            author = rng.choice(authors[:10])
+            channel = dms[author.id]
+        messages.append(FakeMessage(channel, text, author=author))
+    return messages
+
+
+def recorded(bot, path, count):
+    """MessageLogger's JSON lines, ids kept so stickies and settings from --db apply"""
+    guilds = {}
+    channels = {}
+    authors = {}
+    messages = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get("logger") != "nazareth.messages":
+                continue
+            guild_id = entry.get("guild_id")
+            guild = None if guild_id is None else guilds.setdefault(guild_id, FakeGuild(guild_id))
+            channel = channels.get(entry["channel_id"])
+            if channel is None:
+                channel = channels[entry["channel_id"]] = FakeChannel(bot.rest, entry["channel_id"], guild)
+            author = authors.get(entry["author_id"])
+            if author is None:
+                author = authors[entry["author_id"]] = FakeAuthor(entry["author_id"], entry["author"])
+            messages.append(FakeMessage(channel, entry["content"], author=author))
+            if len(messages) >= count:
+                break
+    return messages
+
+
+def load_cogs(bot, scenario, workdir):
+    from cogs.easter_eggs import EasterEggs
+    from events.dm_logger import DmLogger
+    from events.on_message import MessageLogger
+    from events.sticky_event import NzStickyHandler
+
+    cogs = []
+    if scenario in ("eggs", "all"):
+        cogs.append(EasterEggs(bot))
+    if scenario in ("sticky", "all"):
+        cogs.append(NzStickyHandler(bot, bot.sticky_db))
+    if scenario in ("dm", "all"):
+        cog = DmLogger(bot)
+        cog.target = FakeChannel(bot.rest)
+        cogs.append(cog)
+    if scenario in ("logger", "all"):
+        bot.log_writer = setup_logging(os.path.join(workdir, "replay.jsonl"), console_level="CRITICAL")
+        cogs.append(MessageLogger(bot))
+    return cogs
+
+
+def time_handlers(bot):
+    # the dispatcher only keeps totals, the percentiles need every sample
+    samples = {}
+    for handlers in bot.dispatcher.routes.values():
+        for name, handler in list(handlers.items()):
+            times = samples.setdefault(name, [])
+
+            async def timed(message, handler=handler, times=times):
+                start = time.perf_counter()
+                try:
+                    await handler(message)
+                finally:
+                    times.append(time.perf_counter() - start)
+            handlers[name] = timed
+    return samples
+
+
+async def drain():
+    tasks = [t for t in asyncio.all_tasks() if t.get_name().startswith("nz-dispatch:")]
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def replay(scenario, args):
+    workdir = tempfile.mkdtemp()
+    bot = await build_bot(workdir, args.db)
+    if args.record:
+        messages = recorded(bot, args.record, args.messages)
+    else:
+        messages = await synthetic(bot, args.messages)
+    cogs = load_cogs(bot, scenario, workdir)
+    for cog in cogs:
+        await cog.cog_load()
+    samples = time_handlers(bot)
+    bot.rest.reset()
+    commits = bot.pool.commits
+
+    start = time.perf_counter()
+    gap = 1 / args.rate if args.rate else 0
+    for message in messages:
+        bot.dispatcher.dispatch(message)
+        await asyncio.sleep(gap)  # one gateway event at a time
+    await drain()
+    elapsed = time.perf_counter() - start
+
+    # what the listeners deferred (debounced reposts, buffered edits and
+    # writes) still counts against the messages that caused it
+    await asyncio.sleep(max(config.sticky_max_delay, config.dm_flush_interval) + 0.1)
+    for cog in cogs:
+        await cog.cog_unload()
+    await bot.db.close()
+    await bot.dm_archive.close()
+    commits = bot.pool.commits - commits
+    await bot.pool.close()
+    if getattr(bot, "log_writer", None) is not None:
+        await asyncio.to_thread(bot.log_writer.stop)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    count = len(messages)
+    print(f"{scenario:<10} {count:>6} msgs  {count / elapsed:9.0f} msgs/s  "
+          f"{bot.rest.total / count:5.3f} REST/msg  {commits / count:5.3f} commits/msg  {dict(bot.rest.calls)}")
+    for name, times in sorted(samples.items()):
+        if times:
+            print(f"  {name:<16} {len(times):>6} calls  p50 {percentile(times, 0.5) * 1000:7.3f} ms  "
+                  f"p99 {percentile(times, 0.99) * 1000:7.3f} ms  max {max(times) * 1000:7.3f} ms")
+
+
+async def database(args):
+    """The NzDatabase calls the cogs make, in roughly the mix they make them"""
+    workdir = tempfile.mkdtemp()
+    bot = await build_bot(workdir, args.db)
+    db = bot.db
+    rng = random.Random(0)
+    users = [rng.randrange(10 ** 17, 10 ** 18) for _ in range(1000)]
+    guild_id = 1
+    ops = (
+        ("get_credits", 50, lambda u: db.get_credits(u)),
+        ("update_credits", 20, lambda u: db.update_credits(u, rng.randint(-50, 100))),
+        ("is_verified", 10, lambda u: db.is_verified(guild_id, u)),
+        ("set_user_verification", 10, lambda u: db.set_user_verification(guild_id, u, 1)),
+        ("get_top_credits", 5, lambda u: db.get_top_credits(10)),
+        ("get_credit_rank", 5, lambda u: db.get_credit_rank(u)),
+    )
+    plan = rng.choices(ops, weights=[weight for _, weight, _ in ops], k=args.messages)
+    samples = {name: [] for name, _, _ in ops}
+    commits = bot.pool.commits
+
+    start = time.perf_counter()
+    for name, _, op in plan:
+        t = time.perf_counter()
+        await op(rng.choice(users))
+        samples[name].append(time.perf_counter() - t)
+    await db.flush()
+    elapsed = time.perf_counter() - start
+    commits = bot.pool.commits - commits
+
+    await db.close()
+    await bot.dm_archive.close()
+    await bot.pool.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'database':<10} {len(plan):>6} ops   {len(plan) / elapsed:9.0f} ops/s   "
+          f"{commits / len(plan):5.3f} commits/op")
+    for name, times in samples.items():
+        if times:
+            print(f"  {name:<22} {len(times):>6} calls  p50 {percentile(times, 0.5) * 1000:7.3f} ms  "
+                  f"p99 {percentile(times, 0.99) * 1000:7.3f} ms  max {max(times) * 1000:7.3f} ms")
+
+
+async def main(args):
+    # reposts and relays settle in well under a second instead of the production
+    # delays, and nothing is throttled that production wouldn't throttle per user
+    config.sticky_quiet_period = 0.05
+    config.sticky_max_delay = 0.5
+    config.sticky_rate = 10 ** 9
+    config.dm_flush_interval = 0.1
+    for scenario in args.scenario or SCENARIOS:
+        if scenario == "database":
+            await database(args)
+        else:
+            await replay(scenario, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS)
+    parser.add_argument("--record")
+    parser.add_argument("--db")
+    parser.add_argument("--rate", type=float)
+    asyncio.run(main(parser.parse_args()))
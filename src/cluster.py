@@ -0,0 +1,141 @@
+# runs the bot as config.cluster_processes processes, each with a contiguous
+# slice of the shards, all sharing nazareth.db
+# run from src/ like nazareth.py: python cluster.py [processes]
+# q (and y to confirm) stops every worker the same way it stops a single bot
+import json
+import os
+import subprocess
+import sys
+import threading
+import urllib.request
+import config
+
+IDENTIFY_WAIT = 5.0  # discord wants this long between identifies per concurrency bucket
+
+
+def gateway_info():
+    """(recommended shard count, max identify concurrency) for this token"""
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {config.token}", "User-Agent": "DiscordBot (nazareth, 1.0)"}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        data = json.load(response)
+    return data["shards"], data["session_start_limit"]["max_concurrency"]
+
+
+def shard_slices(shard_count, processes):
+    """Contiguous shard id ranges, as even as they go, no empty ones"""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    slices = []
+    start = 0
+    for i in range(processes):
+        end = start + size + (1 if i < extra else 0)
+        slices.append(list(range(start, end)))
+        start = end
+    return slices
+
+
+class NzWorker:
+    def __init__(self, cluster_id, shard_ids, shard_count):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process = None
+
+    def start(self):
+        env = dict(os.environ)
+        env["NZ_CLUSTER_ID"] = str(self.cluster_id)
+        env["NZ_SHARD_IDS"] = ",".join(map(str, self.shard_ids))
+        env["NZ_SHARD_COUNT"] = str(self.shard_count)
+        self.process = subprocess.Popen([sys.executable, "nazareth.py"], stdin=subprocess.PIPE, env=env, text=True)
+        print(f"Started cluster {self.cluster_id} (pid {self.process.pid}) with shards {self.shard_ids}")
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        # the worker's own shutdown handler, so it closes the db cleanly
+        if self.alive():
+            try:
+                self.process.stdin.write("q\ny\n")
+                self.process.stdin.flush()
+            except OSError:
+                pass
+
+
+class NzCluster:
+    def __init__(self, processes):
+        shard_count, concurrency = config.shard_count, 1
+        if shard_count is None:
+            shard_count, concurrency = gateway_info()
+        self.workers = [
+            NzWorker(i, shard_ids, shard_count)
+            for i, shard_ids in enumerate(shard_slices(shard_count, processes))
+        ]
+        self.concurrency = concurrency
+        self.stopping = threading.Event()
+        self.restarts = {}  # cluster_id -> pending restart timer
+        # held while a restart spawns a worker, so stop() never misses one
+        self.spawn_lock = threading.Lock()
+
+    def run(self):
+        threading.Thread(target=self.shutdown_handler, daemon=True).start()
+        for worker in self.workers:
+            if self.stopping.is_set():
+                break
+            worker.start()
+            # every worker identifies all its shards, don't let the next one
+            # start identifying on top of it
+            self.stopping.wait(len(worker.shard_ids) * IDENTIFY_WAIT / self.concurrency)
+        while not self.stopping.wait(1.0):
+            for worker in self.workers:
+                if worker.process is not None and not worker.alive():
+                    print(f"Cluster {worker.cluster_id} exited with {worker.process.returncode}, "
+                          f"restarting in {config.cluster_restart_delay}s")
+                    worker.process = None
+                    timer = threading.Timer(config.cluster_restart_delay, self.restart, (worker,))
+                    self.restarts[worker.cluster_id] = timer
+                    timer.start()
+        self.stop()
+
+    def restart(self, worker):
+        with self.spawn_lock:
+            self.restarts.pop(worker.cluster_id, None)
+            if not self.stopping.is_set():
+                worker.start()
+
+    def stop(self):
+        self.stopping.set()
+        for timer in list(self.restarts.values()):
+            timer.cancel()
+        # a restart that already fired has either spawned its worker by now,
+        # so it's stopped below, or sees stopping and doesn't
+        with self.spawn_lock:
+            self.restarts.clear()
+        for worker in self.workers:
+            worker.stop()
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            try:
+                worker.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                print(f"Cluster {worker.cluster_id} didn't stop, killing it")
+                worker.process.kill()
+
+    def shutdown_handler(self):
+        while True:
+            cmd = input().strip().lower()
+            if cmd == "q":
+                confirm = input("Are you sure you want to shut down every cluster? (y/n): ").strip().lower()
+                if confirm == "y":
+                    print("Shutting down...")
+                    self.stopping.set()
+                    break
+
+
+if __name__ == "__main__":
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else config.cluster_processes
+    NzCluster(processes).run()
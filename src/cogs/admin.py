@@ -1,66 +1,72 @@
+import discord
 from discord.ext import commands
+import asyncio
 import os
 import importlib
 import config
+from nz_extensions import fingerprint, inspect_extension, load_levels, scan
 
 class NzCogManager(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # polls the extension folders and reloads whatever changed, for development
+        self.watching = False
+        self.watcher = None
+        self.watch_channel_id = None
+        self.was_watching = False  # as it was before unload stopped it, for ~reload
+
+    async def cog_load(self):
+        if config.reload_watch:
+            self.start_watching(None)
+
+    async def cog_unload(self):
+        self.was_watching = self.watching
+        self.watching = False
+        # when the watcher is the one reloading us it finishes the round and exits by itself
+        if self.watcher is not None and self.watcher is not asyncio.current_task():
+            self.watcher.cancel()
+
+    def export_state(self):
+        return {"watching": self.was_watching, "channel_id": self.watch_channel_id}
+
+    def import_state(self, state):
+        if state["watching"]:
+            self.start_watching(state["channel_id"])
 
     @commands.command(name="reload")
     @commands.is_owner()
     async def reload_cog(self, ctx, cog: str = None):
         if cog is None:
-            await ctx.send("Usage: `~reload <cog_name>` or `~reload all`")
+            await ctx.send("Usage: `~reload <cog_name>`, `~reload all` or `~reload watch`")
             return
         
         folders = [config.cog_folder, config.event_folder]
         if cog.lower() == "all":
             importlib.reload(config)
 
-            current_extensions = set(self.bot.extensions.keys())
-            cog_files = set()
-
-            for folder in folders:
-                for f in os.listdir(folder):
-                    if f.endswith(".py") and not f.startswith("_"):
-                        cog_files.add(f"{folder}.{f[:-3]}")
-                            
-            success = []
-            failed = []
-
-            for ext in current_extensions & cog_files:
-                try:
-                    await self.bot.reload_extension(ext)
-                    success.append(f"Reloaded {ext}")
-                except Exception as e:
-                    failed.append(f"{ext}: {e}")
-                    
-            for ext in current_extensions - cog_files:
-                try:
-                    await self.bot.unload_extension(ext)
-                    success.append(f"Unloaded {ext}")
-                except Exception as e:
-                    failed.append(f"{ext}: {e}")
-
-            for ext in cog_files - current_extensions:
-                try:
-                    await self.bot.load_extension(ext)
-                    success.append(f"Loaded {ext}")
-                except Exception as e:
-                    failed.append(f"{ext}: {e}")
-
-            msg = "\n".join(success)
+            success, failed = await self.reload_changed()
+            msg = "\n".join(success) or "Nothing changed"
             if failed:
                 msg += "\nFailed:\n" + "\n".join(failed)
 
             await ctx.send(f"```{msg}```")
             return
+
+        if cog.lower() == "watch":
+            if self.watching:
+                self.watching = False
+                self.watcher.cancel()
+                await ctx.send("Stopped watching for changes")
+            else:
+                self.start_watching(ctx.channel.id)
+                await ctx.send(f"Watching for changes every {config.reload_watch_interval}s")
+            return
         
         tgt_ext = None
 
         for folder in folders:
-            if os.path.exists(os.path.join(folder, f"{cog}.py")):
+            tgt_path = os.path.join(folder, f"{cog}.py")
+            if os.path.exists(tgt_path):
                 tgt_ext = f"{folder}.{cog}"
                 break
             
@@ -69,10 +75,165 @@ class NzCogManager(commands.Cog):
             return
             
         try:
-            await self.bot.reload_extension(tgt_ext)
+            await self.reload_one(tgt_ext, tgt_path)
             await ctx.send(f"Reloaded cog: `{cog}`")
         except Exception as e:
             await ctx.send(f"Failed to reload cog `{cog}`:\n```{e}```")
 
+    async def reload_one(self, ext, path):
+        """Reloads ext whether or not it changed, handing its cogs' state to the new instances"""
+        self.bot.fingerprints[ext] = fingerprint(path, self.bot.fingerprints.get(ext))
+        self.bot.ext_info[ext] = inspect_extension(ext, path)
+        old = [cog for cog in self.bot.cogs.values() if cog.__module__ == ext]
+        try:
+            await self.bot.reload_extension(ext)
+        finally:
+            # a failed reload puts the old code back, as a new instance, so it gets the state too
+            for cog in old:
+                new = self.bot.get_cog(cog.qualified_name)
+                if new is not None and new is not cog and hasattr(cog, "export_state") and hasattr(new, "import_state"):
+                    new.import_state(cog.export_state())
+
+    def changed_files(self, files):
+        """The extensions whose source changed since they were last (re)loaded"""
+        changed = set()
+        for ext, path in files.items():
+            old = self.bot.fingerprints.get(ext)
+            new = fingerprint(path, old)
+            if old is None or new[2] != old[2]:
+                changed.add(ext)
+            # remembered even when the reload fails, a broken file is retried once it's edited again
+            self.bot.fingerprints[ext] = new
+        return changed
+
+    async def reload_changed(self):
+        """Reloads changed extensions and whatever requires them, loads new ones and unloads deleted ones"""
+        files = scan([config.cog_folder, config.event_folder])
+        loaded = set(self.bot.extensions)
+        changed = self.changed_files(files)
+        info = self.bot.ext_info
+        for ext in set(info) - set(files):
+            del info[ext]
+        for ext in changed:
+            info[ext] = inspect_extension(ext, files[ext])
+
+        success = []
+        failed = []
+
+        for ext in loaded - set(files):
+            try:
+                await self.bot.unload_extension(ext)
+                self.bot.fingerprints.pop(ext, None)
+                success.append(f"Unloaded {ext}")
+            except Exception as e:
+                failed.append(f"{ext}: {e}")
+
+        # commands of a deferred extension follow its source
+        for name in [name for name, ext in self.bot.deferred.items() if ext in changed or ext not in files]:
+            del self.bot.deferred[name]
+        deferred = set(config.lazy_extensions) & (changed - loaded)
+        for ext in deferred:
+            for name in info[ext].commands:
+                self.bot.deferred[name] = ext
+        deferred = {ext for ext in deferred if info[ext].commands}
+
+        reload = changed & loaded
+        while True:
+            dependents = {ext for ext in loaded & set(info) if reload.intersection(info[ext].requires)} - reload
+            if not dependents:
+                break
+            reload |= dependents
+        load = changed - loaded - deferred
+
+        # intents are fixed at startup, it still loads but won't get those events
+        for ext in reload | load:
+            missing = [name for name in info[ext].intents if not getattr(self.bot.intents, name)]
+            if missing:
+                failed.append(f"{ext}: needs the {', '.join(missing)} intents, restart to get them")
+
+        levels, broken = load_levels(info)
+        for ext in (reload | load) & set(broken):
+            failed.append(f"{ext}: {broken[ext]}")
+        for level in levels:
+            for ext in level:
+                try:
+                    if ext in reload:
+                        await self.reload_one(ext, files[ext])
+                        success.append(f"Reloaded {ext}")
+                    elif ext in load:
+                        await self.bot.load_extension(ext)
+                        success.append(f"Loaded {ext}")
+                except Exception as e:
+                    failed.append(f"{ext}: {e}")
+        return success, failed
+
+    def start_watching(self, channel_id):
+        self.watch_channel_id = channel_id
+        if not self.watching:
+            self.watching = True
+            self.watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while self.watching:
+            await asyncio.sleep(config.reload_watch_interval)
+            try:
+                success, failed = await self.reload_changed()
+            except Exception as e:
+                print(f"Reload watcher failed: {e}")
+                continue
+            if not success and not failed:
+                continue
+            msg = "\n".join(success)
+            if failed:
+                msg += "\nFailed:\n" + "\n".join(failed)
+            print(msg)
+            if self.watch_channel_id is not None:
+                try:
+                    await self.bot.get_partial_messageable(self.watch_channel_id).send(f"```{msg[:1990]}```")
+                except discord.HTTPException:
+                    pass
+
+    @commands.command(name="cachestats")
+    @commands.is_owner()
+    async def cache_stats(self, ctx):
+        lines = []
+        for table, stats in self.bot.db.cache_stats().items():
+            lines.append(
+                f"{table}: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.1%}), {stats['size']} cached"
+            )
+        await ctx.send("```" + "\n".join(lines) + "```")
+
+    @commands.command(name="handlers")
+    @commands.is_owner()
+    async def handler_stats(self, ctx):
+        lines = []
+        for name, stats in sorted(self.bot.dispatcher.stats.items()):
+            avg = stats.total / stats.calls * 1000 if stats.calls else 0.0
+            lines.append(
+                f"{name}: {stats.calls} calls, {stats.errors} errors, "
+                f"avg {avg:.2f} ms, max {stats.max * 1000:.2f} ms"
+            )
+        await ctx.send("```" + ("\n".join(lines) or "No handlers registered") + "```")
+
+    @commands.command(name="stats")
+    @commands.is_owner()
+    async def stats(self, ctx):
+        # the busiest series of each histogram, by total time spent
+        metrics = self.bot.metrics
+        lines = []
+        for title, name in (("Commands", "nazareth_command_seconds"), ("Listeners", "nazareth_listener_seconds"),
+                            ("Database", "nazareth_db_query_seconds"), ("REST", "nazareth_rest_seconds")):
+            series = sorted(metrics.histograms[name].items(), key=lambda item: item[1].sum, reverse=True)
+            lines.append(f"{title}:" if series else f"{title}: nothing yet")
+            for labels, hist in series[:6]:
+                lines.append(
+                    f"  {' '.join(labels)}: {hist.count} calls, p50 {hist.quantile(0.5) * 1000:.1f} ms, "
+                    f"p99 {hist.quantile(0.99) * 1000:.1f} ms"
+                )
+        errors = sum(metrics.counters["nazareth_rest_errors_total"].values())
+        lines.append(f"REST errors: {errors}, db commits: {self.bot.pool.commits}")
+        await ctx.send("```" + "\n".join(lines)[:1990] + "```")
+
 async def setup(bot):
     await bot.add_cog(NzCogManager(bot))
@@ -1,14 +1,22 @@
 from discord.ext import commands
 import discord
 
+def render_record(member, record):
+    return (
+        f"{member.display_name}: {record.credits} credits, "
+        f"profile: {record.profile}, tax benefits: {record.taxes}"
+    )
+
 class NzCreds(commands.Cog):
+    feature = "creds"
+
     def __init__(self, bot):
         self.bot = bot
 
     @commands.group(name="creds", invoke_without_commands=True)
     async def creds(self, ctx):
         if ctx.invoked_subcommand is None:
-            await ctx.send("```Available subcommands:\nshow - shows the amount of social credts you have\nprofile - describes your profile\ntaxes - shows your tax benefits, negative means you owe money, positive means you ARE owed money```")
+            await ctx.send("```Available subcommands:\nshow - shows the amount of social credts you have\nprofile - describes your profile\ntaxes - shows your tax benefits, negative means you owe money, positive means you ARE owed money\nall [members...] - everything above at once, for you or everyone mentioned\ntop [count] - the richest citizens\nrank - where you stand```")
 
     @creds.command(name="show")
     async def show_creds(self, ctx, memb: discord.Member = None):
@@ -34,5 +42,46 @@ class NzCreds(commands.Cog):
         taxes = await self.bot.db.get_taxes(member.id)
         await ctx.send(f"{member.display_name}'s tax benefits: {taxes}")
 
+    @creds.command(name="all")
+    async def show_all(self, ctx, members: commands.Greedy[discord.Member] = None):
+        members = members or [ctx.author]
+        # one query for everybody instead of three per member
+        records = await self.bot.db.get_social_records(m.id for m in members)
+        out = ""
+        for m in members:
+            line = render_record(m, records[m.id]) + "\n"
+            if len(out) + len(line) > 2000:
+                await ctx.send(out)
+                out = ""
+            out += line
+        await ctx.send(out)
+
+    @creds.command(name="top")
+    async def show_top(self, ctx, count: int = 10):
+        count = max(1, min(count, 25))
+        top = await self.bot.db.get_top_credits(count)
+        if not top:
+            await ctx.send("Nobody has any credits yet.")
+            return
+        lines = []
+        for pos, (user_id, credits) in enumerate(top, start=1):
+            # without a member cache (lean profile) this is a mention, which
+            # discord renders as the name anyway, rather than a fetch per row
+            member = ctx.guild.get_member(user_id) if ctx.guild else None
+            name = member.display_name if member else f"<@{user_id}>"
+            lines.append(f"{pos}. {name} - {credits}")
+        await ctx.send("\n".join(lines), allowed_mentions=discord.AllowedMentions.none())
+
+    @creds.command(name="rank")
+    async def show_rank(self, ctx, memb: discord.Member = None):
+        member = ctx.author
+        if memb is not None:
+            member = memb
+        rank = await self.bot.db.get_credit_rank(member.id)
+        if rank is None:
+            await ctx.send(f"{member.display_name} isn't ranked yet.")
+            return
+        await ctx.send(f"{member.display_name} is ranked #{rank[0]} of {rank[1]}.")
+
 async def setup(bot):
     await bot.add_cog(NzCreds(bot))
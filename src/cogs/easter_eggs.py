@@ -1,9 +1,17 @@
 from discord.ext import commands
 import config
 import random
-import asyncio
-import time
+import discord
+from nz_egg_store import GLOBAL_SCOPE
+from nz_ratelimit import NzRateLimiter
 
+# when one of these shows up it's the only reply, whatever else matched
+priority_eggs = ("pretty please",)
+# for the lean cache profile
+required_intents = ("guild_messages", "message_content")
+
+# seeds the global basket the first time the EasterEggs table is created,
+# after that eggs live in the database and are edited with ~eggs
 eggs_basket = {
     "gay": "i know you like kissing men, but i just can't prove it",
     "femboy": ["astolfo.", "totsuka saiki.", "ruka urushibara.", "twilight😳"],
@@ -30,48 +38,110 @@ eggs_basket = {
 }
 
 class EasterEggs(commands.Cog):
+    feature = "eggs"
+
     def __init__(self, bot):
         self.bot = bot
-        self.last_trigger = {}
-        self.cooldown = 2
+        self.store = bot.egg_store
+        # only messages that actually hit an egg spend a token
+        self.limiter = NzRateLimiter(config.egg_rate, config.egg_per, scope=config.egg_scope)
+
+    async def cog_load(self):
+        self.bot.dispatcher.register("easter_eggs", "brainrot", self.handle_message)
+
+    async def cog_unload(self):
+        self.bot.dispatcher.unregister("easter_eggs")
+
+    # carried over to the new instance by ~reload
+    def export_state(self):
+        return {"buckets": self.limiter.buckets()}
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.channel.id not in config.brainrot_channels:
+    def import_state(self, state):
+        self.limiter.restore(state["buckets"])
+
+    # brainrot channels only, bots are already filtered out by the dispatcher
+    async def handle_message(self, message):
+        guild_id = message.guild.id if message.guild else GLOBAL_SCOPE
+        if message.content.startswith(self.bot.settings.index.prefix(guild_id)):
             return
-        
-        if message.author.bot:
+
+        found = self.store.find(message.content.lower(), guild_id, message.channel.id)
+        if not found:
             return
 
-        if message.content.startswith(self.bot.command_prefix):
+        # silently, replying "slow down" would be exactly the spam we're cutting
+        if not self.limiter.allow(message):
             return
-        
-        con = message.content.lower()
-        matches = []
-        for egg, response in eggs_basket.items():
-            if egg in con:
-                
-                if egg == "pretty please":
-                    await message.reply(response, mention_author=False)
-                    return
-                matches.append(response)
-
-                '''
-                user_id = message.author.id
-                now = time.monotonic()
-
-                last = self.last_trigger.get(user_id, 0)
-                if now - last < self.cooldown:
-                    await message.reply("woah, slow down there", mention_author=True)
-                    return
-                self.last_trigger[user_id] = now
-                '''
-                                            
-        if matches:
-            response = random.choice(matches)
-            if isinstance(response, list):
-                response = random.choice(response)
-            await message.reply(response, mention_author=False)
+
+        for egg in priority_eggs:
+            if egg in found:
+                await message.reply(random.choice(found[egg]), mention_author=False)
+                return
+
+        responses = random.choice(list(found.values()))
+        await message.reply(random.choice(responses), mention_author=False)
+
+    @commands.group(name="eggs", invoke_without_command=True)
+    async def eggs(self, ctx):
+        if ctx.invoked_subcommand is None:
+            await ctx.send(
+                "```Available subcommands:\n"
+                "add <trigger> <response> - adds an egg to this server (quote triggers with spaces)\n"
+                "remove <trigger> - removes an egg from this server\n"
+                "addhere <trigger> <response> - adds an egg to this channel only\n"
+                "removehere <trigger> - removes an egg from this channel\n"
+                "list - shows this server's and this channel's eggs```"
+            )
+
+    async def _add(self, ctx, scope_id, trigger, response):
+        if not trigger or not response:
+            await ctx.send("```Usage: ~eggs add <trigger> <response>```")
+            return
+        await self.store.add_egg(scope_id, trigger, response)
+        await ctx.send(f"Added egg `{trigger.lower()}`")
+
+    async def _remove(self, ctx, scope_id, trigger):
+        if not trigger:
+            await ctx.send("```Usage: ~eggs remove <trigger>```")
+            return
+        if await self.store.remove_egg(scope_id, trigger):
+            await ctx.send(f"Removed egg `{trigger.lower()}`")
+        else:
+            await ctx.send(f"No egg `{trigger.lower()}` here")
+
+    @eggs.command(name="add")
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def eggs_add(self, ctx, trigger: str = None, *, response: str = None):
+        await self._add(ctx, ctx.guild.id, trigger, response)
+
+    @eggs.command(name="remove")
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def eggs_remove(self, ctx, *, trigger: str = None):
+        await self._remove(ctx, ctx.guild.id, trigger)
+
+    @eggs.command(name="addhere")
+    @commands.has_permissions(manage_channels=True)
+    async def eggs_add_here(self, ctx, trigger: str = None, *, response: str = None):
+        await self._add(ctx, ctx.channel.id, trigger, response)
+
+    @eggs.command(name="removehere")
+    @commands.has_permissions(manage_channels=True)
+    async def eggs_remove_here(self, ctx, *, trigger: str = None):
+        await self._remove(ctx, ctx.channel.id, trigger)
+
+    @eggs.command(name="list")
+    async def eggs_list(self, ctx):
+        lines = []
+        for label, scope_id in (("server", ctx.guild.id if ctx.guild else None), ("channel", ctx.channel.id)):
+            basket = self.store.baskets.get(scope_id)
+            if basket:
+                lines.append(f"{label}: " + ", ".join(sorted(basket)))
+        text = "\n".join(lines) or "No eggs of our own here, just the global ones"
+        await ctx.send(f"```{text[:1990]}```", allowed_mentions=discord.AllowedMentions.none())
 
 async def setup(bot):
+    if not bot.egg_store.loaded:
+        await bot.egg_store.load(eggs_basket)
     await bot.add_cog(EasterEggs(bot))
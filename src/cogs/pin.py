@@ -2,26 +2,41 @@ from discord.ext import commands
 import discord
 
 class NzPin(commands.Cog):
+    feature = "pin"
+
     def __init__(self, bot):
         self.bot = bot
 
+    def target(self, ctx, message_id):
+        # the replied-to message comes with the command, anything else is
+        # pinned by id through a partial message, no fetch or message cache needed
+        reference = ctx.message.reference
+        if reference is not None:
+            if isinstance(reference.resolved, discord.Message):
+                return reference.resolved
+            return ctx.channel.get_partial_message(reference.message_id)
+        if message_id is not None:
+            return ctx.channel.get_partial_message(message_id)
+        return None
+
+    @staticmethod
+    def describe(message):
+        if isinstance(message, discord.Message):
+            return f"{message.content[:50]}..."
+        return f"`{message.id}`"
+
     @commands.command(name="pin")
     async def pin(self, ctx, message_id: int = None):
-        if ctx.message.reference is not None:
-            msg_to_pin = await ctx.channel.fetch_message(ctx.message.reference.message_id)
-        elif message_id is not None:
-            try:
-                msg_to_pin = await ctx.channel.fetch_message(message_id)
-            except:
-                await ctx.send("Could not find a message with that ID.")
-                return
-        else:
+        msg_to_pin = self.target(ctx, message_id)
+        if msg_to_pin is None:
             await ctx.send("You must either reply to a message or provide a message ID")
-            return                
+            return
 
         try:
             await  msg_to_pin.pin()
-            await ctx.send(f"Pinned the message: {msg_to_pin.content[:50]}...")
+            await ctx.send(f"Pinned the message: {self.describe(msg_to_pin)}")
+        except discord.NotFound:
+            await ctx.send("Could not find a message with that ID.")
         except discord.Forbidden:
             await ctx.send("I don't have the permission to pin messages in this channel")
         except discord.HTTPException:
@@ -29,21 +44,16 @@ class NzPin(commands.Cog):
             
     @commands.command(name="unpin")
     async def unpin(self, ctx, message_id: int = None):
-        if ctx.message.reference is not None:
-            msg_to_unpin = await ctx.channel.fetch_message(ctx.message.reference.message_id)
-        elif message_id is not None:
-            try:
-                msg_to_unpin = await ctx.channel.fetch_message(message_id)
-            except:
-                await ctx.send("Could not find a message with that ID.")
-                return
-        else:
+        msg_to_unpin = self.target(ctx, message_id)
+        if msg_to_unpin is None:
             await ctx.send("You must either reply to a message or provide a message ID")
-            return                
+            return
 
         try:
             await  msg_to_unpin.unpin()
-            await ctx.send(f"Unpinned the message: {msg_to_unpin.content[:50]}...")
+            await ctx.send(f"Unpinned the message: {self.describe(msg_to_unpin)}")
+        except discord.NotFound:
+            await ctx.send("Could not find a message with that ID.")
         except discord.Forbidden:
             await ctx.send("I don't have the permission to unpin messages in this channel")
         except discord.HTTPException:
@@ -1,4 +1,10 @@
+import math
 from discord.ext import commands
+import config
+
+def ms(latency):
+    # inf/nan until a shard's first heartbeat
+    return f"{round(latency * 1000)} ms" if math.isfinite(latency) else "connecting"
 
 class NzPing(commands.Cog):
     def __init__(self, bot):
@@ -6,7 +12,17 @@ class NzPing(commands.Cog):
 
     @commands.command(name="ping")
     async def ping(self, ctx):
-        await ctx.send(f"Pong! Latency: {round(self.bot.latency*1000)} ms")
+        if not isinstance(self.bot, commands.AutoShardedBot):
+            await ctx.send(f"Pong! Latency: {ms(self.bot.latency)}")
+            return
+        here = ctx.guild.shard_id if ctx.guild else 0  # DMs come in on shard 0
+        lines = [
+            f"shard {shard_id}: {ms(latency)}" + (" <- here" if shard_id == here else "")
+            for shard_id, latency in sorted(self.bot.latencies)
+        ]
+        # a cluster worker only knows about its own shards
+        where = f" (cluster {config.cluster_id})" if config.cluster_id is not None else ""
+        await ctx.send(f"Pong! Average latency{where}: {ms(self.bot.latency)}\n```" + "\n".join(lines)[:1900] + "```")
 
 async def setup(bot):
     await bot.add_cog(NzPing(bot))
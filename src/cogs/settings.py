@@ -0,0 +1,65 @@
+import discord
+from discord.ext import commands
+from nz_guild_settings import CHANNEL_SETS, FEATURES
+
+SWITCHES = {"on": True, "off": False}
+
+
+class NzSettings(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.settings = bot.settings
+
+    async def cog_check(self, ctx):
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+        return True
+
+    @commands.group(name="settings", invoke_without_command=True)
+    async def settings_group(self, ctx):
+        if ctx.invoked_subcommand is None:
+            index = self.settings.index
+            guild_id = ctx.guild.id
+            lines = [f"prefix: {index.prefix(guild_id)}"]
+            lines.append("features: " + ", ".join(
+                f"{feature} {'on' if index.enabled(guild_id, feature) else 'off'}" for feature in FEATURES
+            ))
+            for name in CHANNEL_SETS:
+                channels = [f"#{c.name}" for c in ctx.guild.text_channels if index.in_set(name, c.id)]
+                lines.append(f"{name}: " + (", ".join(channels) or "no channels"))
+            await ctx.send(
+                "```" + "\n".join(lines) + "\n\n"
+                "Available subcommands:\n"
+                "prefix [prefix] - sets this server's prefix, no prefix goes back to the default\n"
+                "feature <name> <on|off> - switches a feature on or off for this server\n"
+                "channel <set> <on|off> [channel] - adds or removes a channel from a set (this channel by default)```",
+                allowed_mentions=discord.AllowedMentions.none()
+            )
+
+    @settings_group.command(name="prefix")
+    @commands.has_permissions(manage_guild=True)
+    async def settings_prefix(self, ctx, prefix: str = None):
+        await self.settings.set_prefix(ctx.guild.id, prefix)
+        await ctx.send(f"Prefix is now `{self.settings.index.prefix(ctx.guild.id)}`")
+
+    @settings_group.command(name="feature")
+    @commands.has_permissions(manage_guild=True)
+    async def settings_feature(self, ctx, feature: str = None, switch: str = None):
+        if feature not in FEATURES or switch not in SWITCHES:
+            await ctx.send(f"```Usage: ~settings feature <{'|'.join(FEATURES)}> <on|off>```")
+            return
+        await self.settings.set_feature(ctx.guild.id, feature, SWITCHES[switch])
+        await ctx.send(f"Turned {feature} {switch}")
+
+    @settings_group.command(name="channel")
+    @commands.has_permissions(manage_channels=True)
+    async def settings_channel(self, ctx, name: str = None, switch: str = None, channel: discord.TextChannel = None):
+        if name not in CHANNEL_SETS or switch not in SWITCHES:
+            await ctx.send(f"```Usage: ~settings channel <{'|'.join(CHANNEL_SETS)}> <on|off> [channel]```")
+            return
+        channel = channel or ctx.channel
+        await self.settings.set_channel(name, ctx.guild.id, channel.id, SWITCHES[switch])
+        await ctx.send(f"Turned {name} {switch} in {channel.mention}")
+
+async def setup(bot):
+    await bot.add_cog(NzSettings(bot))
@@ -1,10 +1,11 @@
 from discord.ext import commands
-from cogs.nz_sticky_db import NzStickyDb
 
 class NzSticky(commands.Cog):
+    feature = "sticky"
+
     def __init__(self, bot):
         self.bot = bot
-        self.sticky_db = NzStickyDb("nazareth.db")
+        self.sticky_db = bot.sticky_db
 
     @commands.group(name="sticky", invoke_without_command=True)
     async def sticky(self, ctx):
@@ -19,40 +20,34 @@ class NzSticky(commands.Cog):
             await ctx.send("```Usage: ~sticky add <content>```")
             return
 
-        # Add to DB
+        # Add to DB and the runtime cache
         await self.sticky_db.add_channel(ctx.channel.id, content)
+        await ctx.send("Sticky added to this channel!")
 
-        # Update runtime cache
+        # Post sticky immediately, through the channel's worker so it can't
+        # race a repost that's already underway (it also cleans up the sticky
+        # this one replaces)
         handler = self.bot.get_cog("NzStickyHandler")
         if handler:
-            handler.sticky_cache[ctx.channel.id] = {"content": content, "message_id": None, "last_msg_id": None}
-
-            # Post sticky immediately
-            sticky_msg = await ctx.send(content)
-            handler.sticky_cache[ctx.channel.id]["last_msg_id"] = sticky_msg.id
-
-            # Save message_id in DB
-            await self.sticky_db.set_message_id(ctx.channel.id, sticky_msg.id)
-
-        await ctx.send("Sticky added to this channel!")
+            handler.enqueue(ctx.channel, immediate=True)
 
     @sticky.command(name="remove")
     async def sticky_remove(self, ctx):
-        # Remove from DB
-        await self.sticky_db.remove_channel(ctx.channel.id)
+        # Remove from DB and the runtime cache
+        channel_data = await self.sticky_db.remove_channel(ctx.channel.id)
 
-        # Remove from cache and delete last posted sticky
+        # delete last posted sticky
         handler = self.bot.get_cog("NzStickyHandler")
-        if handler and ctx.channel.id in handler.sticky_cache:
-            last_msg_id = handler.sticky_cache[ctx.channel.id].get("last_msg_id")
+        if channel_data:
+            # lets an in-flight repost finish first, so its sticky is the one we delete
+            if handler:
+                await handler.stop(ctx.channel.id)
+            last_msg_id = channel_data.get("last_msg_id")
             if last_msg_id:
                 try:
-                    old_msg = await ctx.channel.fetch_message(last_msg_id)
-                    if old_msg:
-                        await old_msg.delete()
+                    await ctx.channel.get_partial_message(last_msg_id).delete()
                 except Exception:
                     pass
-            handler.sticky_cache.pop(ctx.channel.id)
 
         await ctx.send("Sticky removed from this channel!")
 
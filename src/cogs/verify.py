@@ -2,6 +2,8 @@ from discord.ext import commands
 import discord
 
 class NzVerification(commands.Cog):
+    feature = "verify"
+
     def __init__(self, bot):
         self.bot = bot
 
@@ -30,13 +32,16 @@ class NzVerification(commands.Cog):
         role_id = await self.bot.db.get_guild_role_id(ctx.guild.id)
                     
         if role_id:
-            role = ctx.guild.get_role(role_id)
-            if role:
-                try:
-                    await member.add_roles(role)
-                except discord.Forbidden:
-                    await ctx.send(f"```Error! Insufficient Priveleges!\nI don’t have the permissions to modify roles!```")
-                    return
+            # a bare id is all add_roles needs when the role isn't cached
+            role = ctx.guild.get_role(role_id) or discord.Object(id=role_id)
+            try:
+                await member.add_roles(role)
+            except discord.Forbidden:
+                await ctx.send(f"```Error! Insufficient Priveleges!\nI don’t have the permissions to modify roles!```")
+                return
+            except discord.NotFound:
+                await ctx.send("```Error! Role not found!\nThe verified role is gone, set a new one using ~set_verified_role <role_id>```")
+                return
                     
         else:
             await ctx.send(f"```Error! Role not assigned!\nYou must assign a role id using ~set_verified_role <role_id>```")
@@ -58,13 +63,15 @@ class NzVerification(commands.Cog):
         role_id = await self.bot.db.get_guild_role_id(ctx.guild.id)
                     
         if role_id:
-            role = ctx.guild.get_role(role_id)
-            if role:
-                try:
-                    await member.remove_roles(role)
-                except discord.Forbidden:
-                    await ctx.send(f"```Error! Couldn't assign role\nReason: I don't have permission to modify roles!```")
-                    return
+            role = ctx.guild.get_role(role_id) or discord.Object(id=role_id)
+            try:
+                await member.remove_roles(role)
+            except discord.Forbidden:
+                await ctx.send(f"```Error! Couldn't assign role\nReason: I don't have permission to modify roles!```")
+                return
+            except discord.NotFound:
+                await ctx.send("```Error! Role not found!\nThe verified role is gone, set a new one using ~set_verified_role <role_id>```")
+                return
         else:
             await ctx.send(f"```Error! Role not assigned!\nYou must assign a role id using ~set_verified_role <role_id>```")
             return
@@ -1,9 +1,90 @@
+import os
+
 with open("token.txt") as f:
     token = f.read().strip()    
     
 prefix = "~"
 cog_folder = "cogs"
 event_folder = "events"
+db_readers = 4
+# pragma overrides on top of nz_pool.DEFAULT_PROFILE, None drops a pragma
+db_profile = {}
+db_checkpoint_interval = 300
+db_optimize_interval = 3600
+# social credit / verification upserts are flushed once this many rows are
+# dirty or every db_write_interval seconds, an interval of 0 flushes right away
+db_write_behind = 500
+db_write_interval = 2.0
+# read-through cache for GuildRoles / Verification rows
+db_cache_size = 4096
+db_cache_ttl = 600.0
+# sticky reposts wait for the channel to go quiet this long (0 reposts on
+# every message), but a busy channel still gets one every sticky_max_delay
+sticky_quiet_period = 3.0
+sticky_max_delay = 15.0
+# idle sticky channels give their repost worker back after this many seconds
+sticky_worker_idle = 300.0
+# at most sticky_rate reposts per channel every sticky_per seconds
+sticky_rate = 6
+sticky_per = 60.0
+# how often moved sticky message ids get written back, 0 writes every repost
+sticky_checkpoint_interval = 60.0
+# easter egg replies: egg_rate per egg_per seconds, per user / channel / guild
+egg_rate = 1
+egg_per = 2.0
+egg_scope = "user"
+# structured logging: JSON lines written in batches off the event loop
+log_file = "logs/nazareth.jsonl"
+log_level = "INFO"
+log_levels = {}  # per logger, e.g. {"nazareth.messages": "WARNING"} to stop logging traffic
+log_console_level = "WARNING"
+log_max_bytes = 10 * 1024 * 1024
+log_backups = 5
+log_batch = 256
+log_flush_interval = 1.0
+log_queue_size = 10000  # records past this are dropped, never waited on
+message_log_sample = 1.0  # fraction of message traffic that gets logged
+# DMs are relayed with at most one edit per user every dm_flush_interval seconds
+dm_flush_interval = 2.0
+# sessions idle this long, or beyond the newest dm_session_max, leave memory
+# (they're in the database and pick up where they left off)
+dm_session_ttl = 1800.0
+dm_session_max = 500
+# every DM line also goes to the DmArchive search table, in batches
+dm_archive_batch = 500
+dm_archive_interval = 5.0
+dm_search_page = 5
+# "default" is discord.py's caching with every default intent, "lean" only
+# subscribes to and caches what the extensions declare (required_intents,
+# member_cache, message_cache at the top of the file), see nz_cache_profile.py
+cache_profile = "default"
+# AutoShardedBot instead of Bot, shard_count None lets discord pick
+sharded = False
+shard_count = None
+# python cluster.py splits the shards over cluster_processes worker processes,
+# all on the same nazareth.db. Workers wait longer on each other's writes and
+# reload the credits ranking the others change every cluster_leaderboard_refresh
+# seconds. Each worker logs to its own file and serves metrics on metrics_port + its id
+cluster_processes = 2
+cluster_restart_delay = 5.0
+cluster_busy_timeout = 15000
+cluster_leaderboard_refresh = 60.0
+# set by cluster.py for its workers, not meant to be edited
+cluster_id = int(os.environ["NZ_CLUSTER_ID"]) if "NZ_CLUSTER_ID" in os.environ else None
+cluster_shard_ids = [int(i) for i in os.environ["NZ_SHARD_IDS"].split(",")] if "NZ_SHARD_IDS" in os.environ else None
+cluster_shard_count = int(os.environ["NZ_SHARD_COUNT"]) if "NZ_SHARD_COUNT" in os.environ else None
+# prometheus text on http://metrics_host:metrics_port/metrics, 0 turns it off
+metrics_host = "127.0.0.1"
+metrics_port = 9464
+# extensions loaded on first use of one of their commands instead of at startup
+# (ones without commands load in the background once the bot is ready)
+lazy_extensions = []
+# ~reload all only reloads extensions whose source changed. With reload_watch
+# it happens by itself every reload_watch_interval seconds (for development)
+reload_watch = False
+reload_watch_interval = 1.0
+# only seeds the brainrot channels on first run, after that they live in the
+# database and are managed with ~settings channel
 brainrot_channels = [
     1458815919374467228,
     1446208166160371714,
@@ -1,96 +1,266 @@
 import discord
 from discord.ext import commands
 from datetime import datetime
-from collections import defaultdict
+from collections import OrderedDict
 import asyncio
+import time
+import typing
+import config
+
+SESSION_LIMIT = 40  # lines per log message
+CHAR_LIMIT = 1900   # a bit of headroom under discord's 2000
+# for the lean cache profile
+required_intents = ("dm_messages", "message_content")
+
+
+class DmSession:
+    # ids instead of a discord.Message, the log message is edited through a
+    # partial message and the whole thing round-trips through the DmSessions table
+    __slots__ = ("header", "channel_id", "message_id", "lines", "length", "count",
+                 "pending", "edited", "loaded", "last_seen", "lock")
+
+    def __init__(self, header):
+        self.header = header
+        self.channel_id = None
+        self.message_id = None  # the log message, None until it's been sent
+        self.lines = [header]
+        self.length = len(header)
+        self.count = 0
+        self.pending = []       # lines that came in since the last flush
+        self.edited = False     # lines holds something the log message doesn't show yet
+        self.loaded = False     # checked the database for a session from before a restart
+        self.last_seen = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def restore(self, row):
+        self.header, self.channel_id, self.message_id, self.count, content = row
+        self.lines = [content]
+        self.length = len(content)
+
+    def record(self, user_id):
+        return (user_id, self.header, self.channel_id, self.message_id, self.count, self.content())
+
+    def restart(self):
+        self.message_id = None
+        self.lines = [self.header]
+        self.length = len(self.header)
+        self.count = 0
+
+    def fits(self, line):
+        return self.count < SESSION_LIMIT and self.length + len(line) <= CHAR_LIMIT
+
+    def append(self, line):
+        self.lines.append(line)
+        self.length += len(line)
+        self.count += 1
+        self.edited = True
+
+    def content(self):
+        return "".join(self.lines)
+
+
+def split_lines(text, limit):
+    """text as newline terminated lines of at most limit chars, only overlong lines get cut"""
+    out = []
+    for line in text.splitlines():
+        line += "\n"
+        while len(line) > limit:
+            out.append(line[:limit - 1] + "\n")
+            line = line[limit - 1:]
+        out.append(line)
+    return out
 
-SESSION_LIMIT = 40
 
 class DmLogger(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.target_id = 1473680563083939962
         self.target = None
-        self.sessions = {}
-        self.locks = defaultdict(asyncio.Lock)
-        # user_id -> {
-        #   "message_id": int,
-        #   "count": int
-        # }
+        self.sessions = OrderedDict()  # user_id -> DmSession, least recently active first
+        # sessions idle for session_ttl seconds, or past max_sessions, are
+        # dropped from memory (they're already saved)
+        self.session_ttl = config.dm_session_ttl
+        self.max_sessions = config.dm_session_max
+        # incoming lines are buffered per user and relayed with one edit per
+        # flush_interval, instead of an edit per DM
+        self.flush_interval = config.dm_flush_interval
+        self.dirty = set()
+        self.unsaved = set()  # relayed but not in DmSessions yet, saved next round
+        self.flusher = None
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
+    async def cog_load(self):
+        self.bot.dispatcher.register("dm_logger", "dm", self.handle_message)
+        self.flusher = asyncio.create_task(self._flush_every())
 
-        if message.guild is not None:
-            return
+    async def cog_unload(self):
+        self.bot.dispatcher.unregister("dm_logger")
+        if self.flusher is not None:
+            self.flusher.cancel()
+            # let a flush in flight put its lines and users back first
+            await asyncio.gather(self.flusher, return_exceptions=True)
+            self.flusher = None
+        await self.flush_all()
 
-        if message.author.bot:
-            return
+    # carried over to the new instance by ~reload. Plain records rather than
+    # the sessions themselves, DmSession may have changed with the reload.
+    # Unload flushed everything, so nothing is pending, but a failed save
+    # leaves sessions that still have to be saved
+    def export_state(self):
+        return {
+            "sessions": [(session.record(user_id), session.last_seen, session.loaded)
+                         for user_id, session in self.sessions.items()],
+            "unsaved": set(self.unsaved),
+        }
 
-        timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    def import_state(self, state):
+        # oldest last, each one goes in front of the ones before it
+        for (user_id, *row), last_seen, loaded in reversed(state["sessions"]):
+            if user_id in self.sessions:
+                continue  # already picked up a DM of its own
+            session = DmSession(row[0])
+            session.restore(row)
+            session.last_seen = last_seen
+            session.loaded = loaded
+            self.sessions[user_id] = session
+            self.sessions.move_to_end(user_id, last=False)
+        self.unsaved |= state.get("unsaved", set()) & self.sessions.keys()
 
-        header = f"# DM Session: {message.author} ({message.author.id})\n\n"
-        line = f"[{timestamp}] {message.content}\n"
+    # DMs from people only, the dispatcher does the filtering
+    async def handle_message(self, message: discord.Message):
+        timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        text = f"[{timestamp}] {message.content}"
+        for attachment in message.attachments:
+            text += f"\n[Attachment] [{attachment.filename}]({attachment.url})"
 
         user_id = message.author.id
+        self.bot.dm_archive.add(user_id, str(message.author), timestamp, text)
+        session = self.sessions.get(user_id)
+        if session is None:
+            session = DmSession(f"# DM Session: {message.author} ({user_id})\n\n")
+            self.sessions[user_id] = session
+        else:
+            self.sessions.move_to_end(user_id)
+        session.last_seen = time.monotonic()
+        session.pending.extend(split_lines(text, CHAR_LIMIT - len(session.header)))
+        self.dirty.add(user_id)
 
-        for attachment in message.attachments:
-            line += f"[Attachment] [{attachment.filename}]({attachment.url})\n"
-                
-        async with self.locks[user_id]:
-            content = header + line # simple single instantiation of content variable for all cases :D
-            
-            # fresh session creation
-            if user_id not in self.sessions:
-                log_msg = await self.target.send(content)
-                self.sessions[user_id] = {
-                    "message": log_msg,
-                    "count": 1,
-                    "content": content
-                }
-                return
+    async def _flush_every(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_all()
+            except Exception as e:
+                print(f"DM session save failed: {e}")
 
-            session = self.sessions[user_id]
+    async def flush_all(self):
+        dirty, self.dirty = self.dirty, set()
+        try:
+            results = await asyncio.gather(*(self.flush(user_id) for user_id in dirty), return_exceptions=True)
+        except BaseException:
+            # cancelled mid-flush (unload), each flush put its lines back
+            self.dirty |= dirty
+            raise
+        records = []
+        for user_id, result in zip(dirty, results):
+            if isinstance(result, BaseException):
+                # flush put its lines back, the next round retries them
+                print(f"DM relay for {user_id} failed: {result}")
+                self.dirty.add(user_id)
+            elif result is not None:
+                records.append(result)
+                self.unsaved.add(user_id)
+        # a failed save is retried with whatever the session holds by then
+        saving = {record[0] for record in records}
+        records.extend(self.sessions[user_id].record(user_id) for user_id in self.unsaved - saving
+                       if user_id in self.sessions)
+        saving.update(record[0] for record in records)
+        if records:
+            await self.bot.db.save_dm_sessions(records)
+        self.unsaved -= saving
+        self.evict()
 
-            # creating a new session
-            if session["count"] >= SESSION_LIMIT:
-                log_msg = await self.target.send(content)
-                self.sessions[user_id] = {
-                    "message": log_msg,
-                    "count": 1,
-                    "content": content
-                }
-                return
+    def evict(self):
+        cutoff = time.monotonic() - self.session_ttl
+        for user_id in list(self.sessions):
+            session = self.sessions[user_id]
+            if session.last_seen >= cutoff and len(self.sessions) <= self.max_sessions:
+                break  # everything after this one is more recent
+            # only what's been relayed and saved can go, an unpublished edit
+            # or a pending line would be lost with it
+            if (session.pending or session.edited or user_id in self.dirty
+                    or user_id in self.unsaved or session.lock.locked()):
+                continue
+            del self.sessions[user_id]
 
-            # finally get to editing if the previous checks are passed
+    async def flush(self, user_id):
+        """Publishes the session's new lines, returns its record to save"""
+        session = self.sessions.get(user_id)
+        if session is None:
+            return None
+        async with session.lock:
+            # edited with nothing pending: the last publish failed, retry it
+            if not session.pending and not session.edited:
+                return None
+            if not session.loaded:
+                row = await self.bot.db.get_dm_session(user_id)
+                if row is not None:
+                    session.restore(row)
+                session.loaded = True
+            pending, session.pending = session.pending, []
+            done = 0
             try:
-                session = self.sessions[user_id]
-                log_msg = session["message"]
-                
-                new_content = session["content"] + line
-
-                # Safety for 2000 char limit
-                if len(new_content) > 1900:
-                    log_msg = await self.target.send(content)
-                    self.sessions[user_id] = {
-                        "message": log_msg,
-                        "count": 1,
-                        "content": content
-                    }
-                    return
-
-                await log_msg.edit(content=new_content)
-                session["content"] = new_content
-                session["count"] += 1
+                for line in pending:
+                    if not session.fits(line):
+                        # this log message is full, show what it has and start the next one
+                        await self._publish(session)
+                        session.restart()
+                    session.append(line)
+                    done += 1
+                await self._publish(session)
+            except BaseException:
+                # lines that didn't make it into the session go back in front of
+                # anything newer, the ones that did stay edited and get published
+                # on the retry
+                session.pending[:0] = pending[done:]
+                raise
+            return session.record(user_id)
 
+    async def _publish(self, session):
+        if not session.edited:
+            return
+        if session.message_id is not None:
+            log_msg = self.bot.get_partial_messageable(session.channel_id).get_partial_message(session.message_id)
+            try:
+                await log_msg.edit(content=session.content())
+                session.edited = False
+                return
             except discord.NotFound:
-                # If message deleted manually
-                log_msg = await self.target.send(content)
-                self.sessions[user_id] = {
-                    "message": log_msg,
-                    "count": 1,
-                    "content": content
-                }
+                # If message deleted manually, carry on in a new one
+                pass
+        log_msg = await self.target.send(session.content())
+        session.channel_id = log_msg.channel.id
+        session.message_id = log_msg.id
+        session.edited = False
+
+    @commands.command(name="dmsearch")
+    @commands.is_owner()
+    async def dm_search(self, ctx, page: typing.Optional[int] = 1, *, query: str = None):
+        if not query:
+            await ctx.send("```Usage: ~dmsearch [page] <query>```")
+            return
+        per_page = config.dm_search_page
+        page = max(page, 1)
+        total, rows = await self.bot.dm_archive.search(query, per_page, (page - 1) * per_page)
+        if not rows:
+            await ctx.send(f"No DMs matching `{query}`" if total == 0 else f"Only {total} hits, no page {page}")
+            return
+        pages = (total + per_page - 1) // per_page
+        out = f"**{total} hits**, page {page}/{pages}\n"
+        for user_id, author, ts, snippet in rows:
+            line = f"`{ts}` {author} ({user_id}): {snippet}\n"
+            out += line if len(out) + len(line) <= 2000 else ""
+        await ctx.send(out, allowed_mentions=discord.AllowedMentions.none())
+
 
 async def setup(bot):
     cog = DmLogger(bot)
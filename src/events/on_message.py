@@ -1,14 +1,35 @@
+import logging
 from discord.ext import commands
 
+log = logging.getLogger("nazareth.messages")
+# for the lean cache profile
+required_intents = ("guild_messages", "dm_messages", "message_content")
+
 class MessageLogger(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
+    async def cog_load(self):
+        self.bot.dispatcher.register("message_logger", "all", self.handle_message)
+
+    async def cog_unload(self):
+        self.bot.dispatcher.unregister("message_logger")
+
+    async def handle_message(self, message):
+        # goes to a queue, the file is written from another thread
+        if not log.isEnabledFor(logging.INFO):
             return
-        print(f'Message from {message.author}: {message.content}')
+        log.info(
+            "message",
+            extra={
+                "author": str(message.author),
+                "author_id": message.author.id,
+                "guild_id": message.guild.id if message.guild else None,
+                "channel_id": message.channel.id,
+                "message_id": message.id,
+                "content": message.content,
+            }
+        )
 
 async def setup(bot):
     await bot.add_cog(MessageLogger(bot))
@@ -1,56 +1,205 @@
+import asyncio
+import time
+import discord
 from discord.ext import commands
+import config
+from nz_ratelimit import NzRateLimiter
+
+STALE_LIMIT = 10
+STOP = object()  # queued by stop(), the worker exits without reposting
+NOW = object()   # repost without waiting for the channel to go quiet
+# for the lean cache profile: any guild message bumps the sticky, what it says doesn't matter
+required_intents = ("guild_messages",)
 
 class NzStickyHandler(commands.Cog):
     """Handles sticky message reposting automatically"""
     def __init__(self, bot, sticky_db):
         self.bot = bot
         self.sticky_db = sticky_db
-        self.sticky_cache = {}  # channel_id -> {content, message_id, last_msg_id}
+        # one worker task per active sticky channel does all the reposting, so
+        # reposts in a channel never overlap. A burst of messages only reposts
+        # once the channel has been quiet for quiet_period seconds, but never
+        # later than max_delay after the first one. Workers exit after idle_timeout
+        self.quiet_period = config.sticky_quiet_period
+        self.max_delay = config.sticky_max_delay
+        self.idle_timeout = config.sticky_worker_idle
+        self.workers = {}  # channel_id -> (task, queue of message times)
+        self.limiter = NzRateLimiter(config.sticky_rate, config.sticky_per, scope="channel")
+        self.stale = {}    # channel_id -> sticky ids we failed to delete, retried on the next repost
+        # every repost makes a new sticky id, so message_id is only written back
+        # every checkpoint_interval seconds (and on unload) for the channels that moved
+        self.checkpoint_interval = config.sticky_checkpoint_interval
+        self.dirty = set()
+        self.checkpointer = None
 
-    async def load_cache(self):
-        self.sticky_cache = await self.sticky_db.get_sticky_channels()
+    async def cog_load(self):
+        self.bot.dispatcher.register("sticky", "sticky", self.handle_message)
+        if self.checkpoint_interval:
+            self.checkpointer = asyncio.create_task(self._checkpoint_every())
 
-    @commands.Cog.listener()
-    async def on_ready(self):
-        await self.load_cache()
+    @property
+    def sticky_cache(self):
+        # channel_id -> {content, message_id, last_msg_id}, owned by bot.sticky_db
+        return self.sticky_db.cache
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        channel_data = self.sticky_cache.get(message.channel.id)
-        if not channel_data:
+    async def cog_unload(self):
+        self.bot.dispatcher.unregister("sticky")
+        # never cancelled mid-repost, a sent sticky whose id we lose is never deleted
+        await asyncio.gather(*(self._halt(channel_id) for channel_id in list(self.workers)))
+        if self.checkpointer is not None:
+            self.checkpointer.cancel()
+        await self.checkpoint()
+
+    # carried over to the new instance by ~reload, the workers were stopped
+    # and the message ids checkpointed on unload
+    def export_state(self):
+        return {"buckets": self.limiter.buckets(), "stale": self.stale}
+
+    def import_state(self, state):
+        self.limiter.restore(state["buckets"])
+        for channel_id, ids in state["stale"].items():
+            self.stale.setdefault(channel_id, []).extend(ids)
+
+    async def checkpoint(self):
+        if not self.dirty:
             return
+        dirty, self.dirty = self.dirty, set()
+        rows = [
+            (self.sticky_cache[channel_id]["message_id"], channel_id)
+            for channel_id in dirty if channel_id in self.sticky_cache
+        ]
+        try:
+            await self.sticky_db.set_message_ids(rows)
+        except Exception:
+            self.dirty |= dirty
+            raise
+
+    async def _checkpoint_every(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                print(f"Sticky checkpoint failed: {e}")
+
+    async def stop(self, channel_id: int):
+        """Stop reposting in a channel, waits out a repost that's already underway"""
+        await self._halt(channel_id)
+        self.stale.pop(channel_id, None)
+        self.dirty.discard(channel_id)
+
+    async def _halt(self, channel_id):
+        worker = self.workers.pop(channel_id, None)
+        if worker is not None:
+            task, queue = worker
+            queue.put_nowait(STOP)
+            await asyncio.gather(task, return_exceptions=True)
 
-        # Ignore the sticky itself and any bot messages
-        if message.author.bot or message.id == channel_data.get("last_msg_id"):
+    def enqueue(self, channel, immediate=False):
+        worker = self.workers.get(channel.id)
+        if worker is None:
+            queue = asyncio.Queue()
+            worker = (asyncio.create_task(self._work(channel, queue)), queue)
+            self.workers[channel.id] = worker
+        worker[1].put_nowait(NOW if immediate else time.monotonic())
+
+    # sticky channels only, bot messages (the sticky itself included) never get here
+    async def handle_message(self, message):
+        if message.channel.id not in self.sticky_cache:
             return
 
-        # Delete previous sticky
+        self.enqueue(message.channel)
+
+    async def _work(self, channel, queue):
+        while True:
+            try:
+                first = await asyncio.wait_for(queue.get(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                # wait_for yields while it cancels the get, a message may have
+                # come in since. Checked and popped in the same tick, so none
+                # can slip in after this
+                if not queue.empty():
+                    continue
+                if self.workers.get(channel.id, (None,))[0] is asyncio.current_task():
+                    del self.workers[channel.id]
+                return
+            if first is STOP:
+                return
+
+            if first is not NOW and self.quiet_period:
+                last = first
+                while True:
+                    delay = min(last + self.quiet_period, first + self.max_delay) - time.monotonic()
+                    if delay <= 0:
+                        break
+                    try:
+                        last = await asyncio.wait_for(queue.get(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        break
+                    if last is STOP:
+                        return
+                    if last is NOW:
+                        break
+
+            # over the channel's repost budget, wait it out (what comes in
+            # meanwhile gets folded into this repost)
+            wait = self.limiter.retry_after(channel.id)
+            if wait:
+                await asyncio.sleep(wait)
+            self.limiter.hit(channel.id)
+
+            # everything queued so far is covered by this repost
+            while not queue.empty():
+                if queue.get_nowait() is STOP:
+                    return
+
+            try:
+                await self.repost(channel)
+            except Exception as e:
+                print(f"Sticky repost in {channel.id} failed: {e}")
+
+    async def _delete(self, channel, msg_id):
+        # deleting only needs the id, no point fetching the message first
+        try:
+            await channel.get_partial_message(msg_id).delete()
+        except (discord.NotFound, discord.Forbidden):
+            pass  # already gone, or never will be
+        except discord.HTTPException:
+            return False
+        return True
+
+    async def repost(self, channel):
+        channel_data = self.sticky_cache.get(channel.id)
+        if not channel_data:
+            return
+
+        # Delete previous sticky, plus whatever we couldn't get rid of last time
+        stale = self.stale.pop(channel.id, [])
         last_msg_id = channel_data.get("last_msg_id")
         if last_msg_id:
-            try:
-                old_msg = await message.channel.fetch_message(last_msg_id)
-                if old_msg:
-                    await old_msg.delete()
-            except Exception:
-                pass
+            stale.append(last_msg_id)
+        failed = [msg_id for msg_id in stale if not await self._delete(channel, msg_id)]
+        if failed:
+            self.stale[channel.id] = failed[-STALE_LIMIT:]
 
         # Send new sticky
         content = channel_data.get("content")
         if not content:
             return
 
-        sticky_msg = await message.channel.send(content)
+        sticky_msg = await channel.send(content)
 
         # Update runtime cache
         channel_data["last_msg_id"] = sticky_msg.id
 
-        # Update DB message_id only if sticky ID changed
+        # Persist the new message_id lazily
         if sticky_msg.id != channel_data.get("message_id"):
-            await self.sticky_db.set_message_id(message.channel.id, sticky_msg.id)
             channel_data["message_id"] = sticky_msg.id
+            if self.checkpoint_interval:
+                self.dirty.add(channel.id)
+            else:
+                await self.sticky_db.set_message_id(channel.id, sticky_msg.id)
 
 
 async def setup(bot):
-    from cogs.nz_sticky_db import NzStickyDb
-    sticky_db = NzStickyDb("nazareth.db")
-    await bot.add_cog(NzStickyHandler(bot, sticky_db))
+    await bot.add_cog(NzStickyHandler(bot, bot.sticky_db))
@@ -1,44 +1,294 @@
 import os
+import time
 import asyncio
 import threading
-import discord
 from discord.ext import commands
 import config
-from cogs.nz_sticky_db import NzStickyDb
+from nz_cache_profile import cache_options
 from nz_database import NzDatabase
+from nz_dispatcher import NzDispatcher
+from nz_dm_archive import NzDmArchive
+from nz_egg_store import NzEggStore
+from nz_extensions import NzExtension, discover, fingerprint, load_levels, scan
+from nz_guild_settings import NzGuildSettings
+from nz_logging import setup_logging
+from nz_metrics import NzMetrics, NzMetricsServer, instrument_http
+from nz_pool import NzPool
+from nz_sticky_db import NzStickyDb
 
-intents = discord.Intents.default()
-intents.message_content = True
+def find_extensions():
+    """(name -> NzExtension, cache profile) for the extension folders.
 
+    An extension that can't be read is only marked broken (see NzExtension).
+    If discovery itself goes wrong they're loaded one by one without any
+    declarations, on the default profile since the lean one is built from them.
+    """
+    folders = [config.cog_folder, config.event_folder]
+    try:
+        return discover(folders), config.cache_profile
+    except Exception as e:
+        print(f"Failed to read the extensions, loading them without their declarations: {e}")
+        return {name: NzExtension(name, path) for name, path in scan(folders).items()}, "default"
 
-class Nazareth(commands.Bot):
+
+def guild_prefix(bot, message):
+    if bot.settings is None or message.guild is None:
+        return config.prefix
+    return bot.settings.index.prefix(message.guild.id)
+
+
+def cluster_path(path):
+    # logs/nazareth.jsonl -> logs/nazareth.1.jsonl in cluster worker 1
+    if config.cluster_id is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{config.cluster_id}{ext}"
+
+
+def shard_options():
+    if config.cluster_id is not None:
+        # the slice of shards cluster.py handed this worker
+        return {"shard_ids": config.cluster_shard_ids, "shard_count": config.cluster_shard_count}
+    if config.sharded and config.shard_count:
+        return {"shard_count": config.shard_count}
+    return {}
+
+
+# cluster workers always shard, they run only the shards they were given
+NzBotBase = commands.AutoShardedBot if config.sharded or config.cluster_id is not None else commands.Bot
+
+
+class Nazareth(NzBotBase):
     def __init__(self):
+        # read (not imported) before the client exists, the cache profile is
+        # worked out from what they declare
+        extensions, profile = find_extensions()
         super().__init__(
-            command_prefix=config.prefix,
-            intents=intents
+            command_prefix=guild_prefix,
+            **cache_options(profile, extensions),
+            **shard_options()
         )
+        self.pool=None
         self.db=None
         self.sticky_db=None
+        self.settings=None
+        self.egg_store=None
+        self.dm_archive=None
+        self.metrics=NzMetrics()
+        self.metrics_server=None
+        self.dispatcher=NzDispatcher(self)
+        self.log_writer=None
+        self.load_times={}  # extension -> ms spent in load_extension
+        self.ext_info=extensions  # extension -> NzExtension, read from source at startup
+        self.fingerprints={}  # extension -> source fingerprint it was loaded from, see ~reload
+        self.deferred={}    # command name -> extension that isn't loaded yet
+        self._loading={}    # extension -> task loading it
+        self.add_check(self.feature_check)
 
     async def setup_hook(self):
-        self.db = NzDatabase("nazareth.db")
-        await self.db.init_tables()
-        self.sticky_db = NzStickyDb("nazareth.db")
+        self.log_writer = setup_logging(
+            cluster_path(config.log_file),
+            level=config.log_level,
+            levels=config.log_levels,
+            max_bytes=config.log_max_bytes,
+            backups=config.log_backups,
+            batch_size=config.log_batch,
+            flush_interval=config.log_flush_interval,
+            queue_size=config.log_queue_size,
+            console_level=config.log_console_level,
+            message_sample=config.message_log_sample
+        )
+        instrument_http(self.http, self.metrics)
+        self.metrics.gauge("nazareth_guilds", "Guilds the bot is in", lambda: len(self.guilds))
+        self.metrics.gauge("nazareth_gateway_latency_seconds", "Heartbeat latency", self._latency)
+        self.metrics.gauge("nazareth_db_pending_writes", "Keys waiting in the write-behind buffer", lambda: len(self.db.writes))
+        self.metrics.gauge("nazareth_db_commits", "Transactions committed since startup", lambda: self.pool.commits)
+        if config.metrics_port:
+            port = config.metrics_port + (config.cluster_id or 0)
+            self.metrics_server = NzMetricsServer(self.metrics, config.metrics_host, port)
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                # most likely the port is taken, the bot runs fine without it
+                print(f"Metrics disabled, can't listen on {config.metrics_host}:{port}: {e}")
+                await self.metrics_server.stop()
+                self.metrics_server = None
+        profile = dict(config.db_profile)
+        if config.cluster_id is not None:
+            # the other workers write to the same file
+            profile.setdefault("busy_timeout", config.cluster_busy_timeout)
+        self.pool = NzPool(
+            "nazareth.db",
+            readers=config.db_readers,
+            profile=profile,
+            checkpoint_interval=config.db_checkpoint_interval,
+            optimize_interval=config.db_optimize_interval,
+            metrics=self.metrics
+        )
+        await self.pool.open()
+        self.db = NzDatabase(
+            self.pool,
+            write_behind=config.db_write_behind,
+            write_interval=config.db_write_interval,
+            cache_size=config.db_cache_size,
+            cache_ttl=config.db_cache_ttl,
+            leaderboard_refresh=config.cluster_leaderboard_refresh if config.cluster_id is not None else 0
+        )
+        await self.db.start()
+        self.sticky_db = NzStickyDb(self.pool)
+        await self.sticky_db.load()
+        self.settings = NzGuildSettings(self.pool)
+        await self.settings.load(config.brainrot_channels)
+        self.dm_archive = NzDmArchive(
+            self.pool,
+            batch_size=config.dm_archive_batch,
+            interval=config.dm_archive_interval
+        )
+        await self.dm_archive.start()
+        # loaded (and seeded) by the easter_eggs extension
+        self.egg_store = NzEggStore(self.pool)
         # await self.db.init_db()
-        folders = [config.cog_folder, config.event_folder]
-
-        for folder in folders:
-            for file in os.listdir(folder):
-                if file.endswith(".py") and not file.startswith("_"):
-                    ext = f"{folder}.{file[:-3]}"
-                    try:
-                        await self.load_extension(ext)
-                        print(f"Loaded {ext}")
-                    except Exception as e:
-                        print(f"Failed to load {ext}: {e}")
+        found = self.ext_info
+        levels, broken = load_levels(found)
+        for ext, reason in broken.items():
+            print(f"Failed to load {ext}: {reason}")
+
+        lazy = self._lazy_set(found, levels)
+        idle = []
+        for ext in lazy:
+            if found[ext].commands:
+                for name in found[ext].commands:
+                    self.deferred[name] = ext
+            else:
+                idle.append(ext)
+
+        started = time.perf_counter()
+        failed = set(broken)
+        for level in levels:
+            # everything in a level only needs earlier levels, so they can load together
+            batch = []
+            for ext in level:
+                if ext in lazy:
+                    continue
+                if any(req in failed for req in found[ext].requires):
+                    print(f"Skipped {ext}: a required extension failed to load")
+                    failed.add(ext)
+                    continue
+                batch.append(ext)
+            results = await asyncio.gather(*(self._load(ext) for ext in batch))
+            failed.update(ext for ext, ok in zip(batch, results) if not ok)
+        print(f"Loaded {len(self.extensions)} extensions in {(time.perf_counter() - started) * 1000:.1f} ms"
+              f" ({len(lazy)} deferred)")
+
+        if idle:
+            # listeners without commands have no first use to wait for, they come in after ready
+            asyncio.create_task(self._load_idle(idle))
+
+    def _lazy_set(self, found, levels):
+        # an extension something eager requires can't wait, walk dependents before their requirements
+        lazy = {ext for ext in config.lazy_extensions if ext in found}
+        for level in reversed(levels):
+            for ext in level:
+                if ext not in lazy:
+                    lazy.difference_update(found[ext].requires)
+        return lazy & {ext for level in levels for ext in level}
+
+    async def _load(self, ext):
+        start = time.perf_counter()
+        try:
+            await self.load_extension(ext)
+        except Exception as e:
+            print(f"Failed to load {ext}: {e}")
+            return False
+        self.load_times[ext] = (time.perf_counter() - start) * 1000
+        self.fingerprints[ext] = fingerprint(self.ext_info[ext].path)
+        print(f"Loaded {ext} in {self.load_times[ext]:.1f} ms")
+        return True
+
+    async def load_deferred(self, ext):
+        """Loads a deferred extension (and whatever it requires) once, however many callers ask"""
+        if ext in self.extensions:
+            return True
+        task = self._loading.get(ext)
+        if task is None:
+            task = self._loading[ext] = asyncio.create_task(self._load_deferred(ext))
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._loading.pop(ext, None)
+
+    async def _load_deferred(self, ext):
+        for req in self.ext_info[ext].requires:
+            if req not in self.extensions and not await self.load_deferred(req):
+                return False
+        ok = await self._load(ext)
+        if ok:
+            for name in [name for name, owner in self.deferred.items() if owner == ext]:
+                del self.deferred[name]
+        return ok
+
+    async def _load_idle(self, exts):
+        await self.wait_until_ready()
+        await asyncio.gather(*(self.load_deferred(ext) for ext in exts))
+
+    async def process_commands(self, message):
+        if message.author.bot:
+            return
+        ctx = await self.get_context(message)
+        if ctx.command is None and ctx.invoked_with in self.deferred:
+            # first use of a deferred extension, load it and look the command up again
+            if await self.load_deferred(self.deferred[ctx.invoked_with]):
+                ctx = await self.get_context(message)
+        await self.invoke(ctx)
+
+    def _latency(self):
+        if not self.is_ready():
+            raise RuntimeError("not connected")  # inf until the first heartbeat, leave it out
+        return self.latency
+
+    async def invoke(self, ctx):
+        start = time.perf_counter()
+        try:
+            await super().invoke(ctx)
+        finally:
+            if ctx.command is not None:
+                status = "error" if ctx.command_failed else "ok"
+                self.metrics.observe("nazareth_command_seconds", (ctx.command.qualified_name, status),
+                                     time.perf_counter() - start)
+
+    async def feature_check(self, ctx):
+        # cogs name the feature their commands belong to, guilds can switch it off
+        feature = getattr(ctx.cog, "feature", None)
+        if feature is None or ctx.guild is None:
+            return True
+        return self.settings.index.enabled(ctx.guild.id, feature)
 
     async def on_ready(self):
-        print(f"Logged in as {self.user}")
+        if config.cluster_id is not None:
+            print(f"Logged in as {self.user} (cluster {config.cluster_id}, shards {config.cluster_shard_ids})")
+        else:
+            print(f"Logged in as {self.user}")
+
+    async def on_message(self, message):
+        # listeners hook in through self.dispatcher rather than on_message
+        self.dispatcher.dispatch(message)
+        await self.process_commands(message)
+
+    async def close(self):
+        await super().close()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        # cogs are gone by now, nothing else will touch the db
+        if self.db is not None:
+            await self.db.close()
+        if self.dm_archive is not None:
+            await self.dm_archive.close()
+        if self.pool is not None:
+            await self.pool.close()
+        if self.log_writer is not None:
+            # drains whatever is still queued
+            await asyncio.to_thread(self.log_writer.stop)
 
 
 nz = Nazareth()
@@ -0,0 +1,46 @@
+import discord
+
+PROFILES = ("default", "lean")
+# prefix commands need the messages and their content, any extension with
+# commands gets these whatever it declares
+COMMAND_INTENTS = ("guild_messages", "dm_messages", "message_content")
+
+
+def cache_options(profile, extensions):
+    """Client options (intents, member cache flags, message cache) for a cache profile.
+
+    default - discord.py's defaults plus message_content, how the bot always ran
+    lean    - only what the extensions declare (see NzExtension): the guilds
+              intent, whatever intents they list, member cache flags only when
+              asked for and no message cache unless one wants it. Commands
+              then work off the message payload, partial objects and fetches
+    """
+    if profile == "default":
+        intents = discord.Intents.default()
+        intents.message_content = True
+        return {"intents": intents}
+    if profile != "lean":
+        raise ValueError(f"Unknown cache profile {profile!r}, expected one of {PROFILES}")
+
+    names = {"guilds"}  # discord.py's state barely works without it
+    member_cache = set()
+    message_cache = 0
+    for ext in extensions.values():
+        if ext.commands:
+            names.update(COMMAND_INTENTS)
+        names.update(ext.intents)
+        member_cache.update(ext.member_cache)
+        message_cache = max(message_cache, ext.message_cache)
+
+    intents = discord.Intents(**dict.fromkeys(names, True))
+    flags = discord.MemberCacheFlags.none()
+    for name in member_cache:
+        setattr(flags, name, True)
+    return {
+        "intents": intents,
+        # raises if a flag needs an intent nobody declared, better now than silently empty
+        "member_cache_flags": flags,
+        # 0 would mean discord.py's default of 1000, None turns the cache off
+        "max_messages": message_cache or None,
+        "chunk_guilds_at_startup": intents.members and flags.joined,
+    }
@@ -9,19 +9,82 @@
 # anyway, i guess that's enough
 # fin
 
-import aiosqlite
 import asyncio
+from nz_cache import MISSING, NzTtlCache
+from nz_leaderboard import NzLeaderboard
+from nz_write_buffer import NzWriteBuffer
+
+
+SOCIAL_CHUNK = 500  # stay well under sqlite's bound parameter limit
+SOCIAL_SQL = "SELECT user_id, credits, profile, taxes FROM SocialCredits WHERE user_id IN ({})"
+LEADERBOARD_SQL = "SELECT user_id, credits FROM SocialCredits ORDER BY credits DESC"
+
+
+class NzSocialRecord:
+    """One SocialCredits row"""
+    __slots__ = ("user_id", "credits", "profile", "taxes")
+
+    def __init__(self, user_id: int, credits: int = 0, profile: str = "broke", taxes: float = 0.0):
+        self.user_id = user_id
+        self.credits = credits
+        self.profile = profile
+        self.taxes = taxes
+
+    def __repr__(self):
+        return (f"NzSocialRecord(user_id={self.user_id}, credits={self.credits}, "
+                f"profile={self.profile!r}, taxes={self.taxes})")
+
 
 class NzDatabase:
-    def __init__(self, path="nazareth.db"):
-        self.path = path
-        self.loop = asyncio.get_event_loop()
-        # Schedule table initialization in the background
-        self.loop.create_task(self.init_tables())
+    def __init__(self, pool, write_behind=500, write_interval=2.0, cache_size=4096, cache_ttl=600.0,
+                 leaderboard_refresh=0):
+        self.pool = pool
+        # social credit and verification upserts are buffered here, the
+        # getters below read through it so nobody sees a stale value
+        self.writes = NzWriteBuffer(pool, max_pending=write_behind, interval=write_interval)
+        # GuildRoles and Verification barely ever change, keep them in memory
+        self.role_cache = NzTtlCache(maxsize=cache_size, ttl=cache_ttl)
+        self.verify_cache = NzTtlCache(maxsize=cache_size, ttl=cache_ttl)
+        # credits ranking, loaded once and then kept current by update_credits.
+        # When other processes write credits too (cluster mode) it's reloaded
+        # every leaderboard_refresh seconds to pick up theirs
+        self.leaderboard = NzLeaderboard()
+        self.leaderboard_refresh = leaderboard_refresh
+        self._refresher = None
+
+    async def start(self):
+        await self.init_tables()
+        await self.load_leaderboard()
+        self.writes.start()
+        if self.leaderboard_refresh:
+            self._refresher = asyncio.create_task(self._refresh_leaderboard())
+
+    async def close(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        await self.writes.close()
+
+    async def _refresh_leaderboard(self):
+        while True:
+            await asyncio.sleep(self.leaderboard_refresh)
+            try:
+                await self.load_leaderboard()
+            except Exception as e:
+                print(f"Leaderboard refresh failed: {e}")
+
+    async def flush(self):
+        return await self.writes.flush()
+
+    def cache_stats(self):
+        return {
+            "GuildRoles": self.role_cache.stats(),
+            "Verification": self.verify_cache.stats(),
+        }
 
     async def init_tables(self):
         """Ensure all necessary tables exist"""
-        async with aiosqlite.connect(self.path) as db:
+        async with self.pool.write() as db:
             # Verification table
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS Verification (
@@ -47,7 +110,22 @@ class NzDatabase:
                     taxes REAL DEFAULT 0
                 )
             """)
-            # Sticky channels
+            await db.execute("""
+                CREATE INDEX IF NOT EXISTS SocialCreditsByCredits
+                ON SocialCredits(credits DESC)
+            """)
+            # DmLogger sessions, one per user
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS DmSessions (
+                    user_id INTEGER PRIMARY KEY,
+                    header TEXT NOT NULL,
+                    channel_id INTEGER NOT NULL,
+                    message_id INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    content TEXT NOT NULL
+                )
+            """)
+            # Sticky channels, accessed through NzStickyDb
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS StickyChannels (
                     channel_id INTEGER PRIMARY KEY,
@@ -55,126 +133,155 @@ class NzDatabase:
                     message_id INTEGER
                 )
             """)
-            await db.commit()
 
     # ===== Verification methods =====
     async def set_verified_role(self, guild_id: int, role_id: int):
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("""
-                INSERT INTO GuildRoles(guild_id, role_id)
-                VALUES (?, ?)
-                ON CONFLICT(guild_id) DO UPDATE SET role_id=excluded.role_id
-            """, (guild_id, role_id))
-            await db.commit()
+        await self.pool.execute("""
+            INSERT INTO GuildRoles(guild_id, role_id)
+            VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET role_id=excluded.role_id
+        """, (guild_id, role_id))
+        self.role_cache.invalidate(guild_id)
 
     async def get_guild_role_id(self, guild_id: int):
-        async with aiosqlite.connect(self.path) as db:
-            cursor = await db.execute(
-                "SELECT role_id FROM GuildRoles WHERE guild_id=?", (guild_id,)
-            )
-            row = await cursor.fetchone()
-            return row[0] if row else None
+        role_id = self.role_cache.get(guild_id)
+        if role_id is not MISSING:
+            return role_id
+        version = self.role_cache.version
+        row = await self.pool.fetchone(
+            "SELECT role_id FROM GuildRoles WHERE guild_id=?", (guild_id,)
+        )
+        role_id = row[0] if row else None
+        self.role_cache.put(guild_id, role_id, version)
+        return role_id
 
     async def set_user_verification(self, guild_id: int, user_id: int, verified: int):
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("""
-                INSERT INTO Verification(guild_id, user_id, verified)
-                VALUES (?, ?, ?)
-                ON CONFLICT(guild_id, user_id) DO UPDATE SET verified=excluded.verified
-            """, (guild_id, user_id, verified))
-            await db.commit()
+        self.writes.set_verification(guild_id, user_id, verified)
+        self.verify_cache.invalidate((guild_id, user_id))
 
     async def is_verified(self, guild_id: int, user_id: int):
-        async with aiosqlite.connect(self.path) as db:
-            cursor = await db.execute("""
-                SELECT verified FROM Verification WHERE guild_id=? AND user_id=?
-            """, (guild_id, user_id))
-            row = await cursor.fetchone()
-            return bool(row[0]) if row else False
+        key = (guild_id, user_id)
+        pending = self.writes.verification.get(key)
+        if pending is None:
+            pending = self.writes.flushing_verification.get(key)
+        if pending is not None:
+            return bool(pending)
+        verified = self.verify_cache.get(key)
+        if verified is not MISSING:
+            return verified
+        version = self.verify_cache.version
+        row = await self.pool.fetchone("""
+            SELECT verified FROM Verification WHERE guild_id=? AND user_id=?
+        """, (guild_id, user_id))
+        verified = bool(row[0]) if row else False
+        self.verify_cache.put(key, verified, version)
+        return verified
 
     # ===== Social credits =====
+    def _apply_pending(self, record):
+        writes = self.writes
+        record.credits += writes.credits.get(record.user_id, 0)
+        if record.user_id in writes.profiles:
+            record.profile = writes.profiles[record.user_id]
+        if record.user_id in writes.taxes:
+            record.taxes = writes.taxes[record.user_id]
+        return record
+
+    def _has_pending(self, user_id):
+        writes = self.writes
+        return user_id in writes.credits or user_id in writes.profiles or user_id in writes.taxes
+
+    async def _fetch_social(self, db, user_ids):
+        found = {}
+        for i in range(0, len(user_ids), SOCIAL_CHUNK):
+            chunk = user_ids[i:i + SOCIAL_CHUNK]
+            async with db.execute(SOCIAL_SQL.format(",".join("?" * len(chunk))), chunk) as cursor:
+                for row in await cursor.fetchall():
+                    found[row[0]] = NzSocialRecord(*row)
+        return {
+            uid: self._apply_pending(found.get(uid) or NzSocialRecord(uid))
+            for uid in user_ids
+        }
+
+    async def get_social_record(self, user_id: int):
+        return (await self.get_social_records((user_id,)))[user_id]
+
+    async def get_social_records(self, user_ids):
+        """user_id -> NzSocialRecord for every id asked for, in the same order"""
+        user_ids = list(dict.fromkeys(user_ids))
+        if any(self._has_pending(uid) for uid in user_ids):
+            # some rows have pending writes: read every chunk on the writer and
+            # overlay the writes without letting go of its lock, so a flush
+            # can't land between the rows and the overlay
+            async with self.pool.timed(SOCIAL_SQL), self.pool.locked() as db:
+                return await self._fetch_social(db, user_ids)
+        # nothing pending, whatever comes in meanwhile is either still pending
+        # (and overlaid) or committed before it's swapped out of the buffer
+        async with self.pool.timed(SOCIAL_SQL), self.pool.read() as db:
+            return await self._fetch_social(db, user_ids)
+
     async def get_credits(self, user_id: int):
-        async with aiosqlite.connect(self.path) as db:
-            cursor = await db.execute(
-                "SELECT credits FROM SocialCredits WHERE user_id=?", (user_id,)
-            )
-            row = await cursor.fetchone()
-            return row[0] if row else 0
+        return (await self.get_social_record(user_id)).credits
 
     async def get_profile(self, user_id: int):
-        async with aiosqlite.connect(self.path) as db:
-            cursor = await db.execute(
-                "SELECT profile FROM SocialCredits WHERE user_id=?", (user_id,)
-            )
-            row = await cursor.fetchone()
-            return row[0] if row else "broke"
+        return (await self.get_social_record(user_id)).profile
 
     async def get_taxes(self, user_id: int):
-        async with aiosqlite.connect(self.path) as db:
-            cursor = await db.execute(
-                "SELECT taxes FROM SocialCredits WHERE user_id=?", (user_id,)
-            )
-            row = await cursor.fetchone()
-            return row[0] if row else 0.0
+        return (await self.get_social_record(user_id)).taxes
 
     async def update_credits(self, user_id: int, amount: int):
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("""
-                INSERT INTO SocialCredits(user_id, credits)
-                VALUES (?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET credits = credits + excluded.credits
-            """, (user_id, amount))
-            await db.commit()
+        self.writes.add_credits(user_id, amount)
+        if self.leaderboard.loaded:
+            self.leaderboard.add(user_id, amount)
 
     async def update_profile(self, user_id: int, profile: str):
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("""
-                INSERT INTO SocialCredits(user_id, profile)
-                VALUES (?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET profile=excluded.profile
-            """, (user_id, profile))
-            await db.commit()
+        self.writes.set_profile(user_id, profile)
+        if self.leaderboard.loaded:
+            self.leaderboard.add(user_id, 0)  # the upsert may have created the row
 
     async def update_taxes(self, user_id: int, taxes: float):
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("""
-                INSERT INTO SocialCredits(user_id, taxes)
-                VALUES (?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET taxes=excluded.taxes
-            """, (user_id, taxes))
-            await db.commit()
-
-    # ===== Sticky channels =====
-    async def add_sticky_channel(self, channel_id: int, content: str):
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("""
-                INSERT INTO StickyChannels(channel_id, content)
-                VALUES (?, ?)
-                ON CONFLICT(channel_id) DO UPDATE SET content=excluded.content
-            """, (channel_id, content))
-            await db.commit()
-
-    async def remove_sticky_channel(self, channel_id: int):
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute(
-                "DELETE FROM StickyChannels WHERE channel_id=?", (channel_id,)
-            )
-            await db.commit()
-
-    async def set_sticky_message_id(self, channel_id: int, message_id: int):
-        async with aiosqlite.connect(self.path) as db:
-            await db.execute("""
-                UPDATE StickyChannels SET message_id=? WHERE channel_id=?
-            """, (message_id, channel_id))
-            await db.commit()
-
-    async def get_sticky_channels(self):
-        async with aiosqlite.connect(self.path) as db:
-            cursor = await db.execute(
-                "SELECT channel_id, content, message_id FROM StickyChannels"
-            )
-            rows = await cursor.fetchall()
-            return {
-                row[0]: {"content": row[1], "message_id": row[2], "last_msg_id": None}
-                for row in rows
-            }
+        self.writes.set_taxes(user_id, taxes)
+        if self.leaderboard.loaded:
+            self.leaderboard.add(user_id, 0)
+
+    # ===== Leaderboard =====
+    async def load_leaderboard(self):
+        # walks the credits index, pending writes are applied on top while we
+        # still hold the lock so a flush can't get counted twice
+        async with self.pool.timed(LEADERBOARD_SQL), self.pool.locked() as db:
+            async with db.execute(LEADERBOARD_SQL) as cursor:
+                self.leaderboard.load(await cursor.fetchall())
+            for user_id in self.writes.profiles.keys() | self.writes.taxes.keys():
+                self.leaderboard.add(user_id, 0)
+            for user_id, delta in self.writes.credits.items():
+                self.leaderboard.add(user_id, delta)
+
+    async def get_top_credits(self, limit: int = 10, offset: int = 0):
+        if not self.leaderboard.loaded:
+            await self.load_leaderboard()
+        return self.leaderboard.top(limit, offset)
+
+    async def get_credit_rank(self, user_id: int):
+        """(rank, out of how many) or None when the user has no row yet"""
+        if not self.leaderboard.loaded:
+            await self.load_leaderboard()
+        rank = self.leaderboard.rank(user_id)
+        return (rank, len(self.leaderboard)) if rank else None
+
+    # ===== DM sessions =====
+    async def save_dm_sessions(self, records):
+        """records of (user_id, header, channel_id, message_id, count, content)"""
+        await self.pool.executemany("""
+            INSERT INTO DmSessions(user_id, header, channel_id, message_id, count, content)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                header=excluded.header, channel_id=excluded.channel_id,
+                message_id=excluded.message_id, count=excluded.count, content=excluded.content
+        """, records)
+
+    async def get_dm_session(self, user_id: int):
+        """(header, channel_id, message_id, count, content) or None"""
+        return await self.pool.fetchone(
+            "SELECT header, channel_id, message_id, count, content FROM DmSessions WHERE user_id=?",
+            (user_id,)
+        )
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+ROUTES = ("all", "dm", "brainrot", "sticky")
+
+
+class NzHandlerStats:
+    __slots__ = ("calls", "errors", "total", "max")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+class NzDispatcher:
+    """The bot's only on_message fan-out.
+
+    Each message is classified once and only the handlers registered for the
+    routes it falls into get a task:
+      all      - every message not sent by a bot
+      dm       - direct messages
+      brainrot - the guild's brainrot channels (bot.settings)
+      sticky   - channels with a sticky (bot.sticky_db.cache)
+    Bot authors never reach a handler, and neither do guilds that switched the
+    route's feature off. Cogs register in cog_load and unregister in cog_unload.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.routes = {route: {} for route in ROUTES}  # route -> {name: handler}
+        self.stats = {}  # name -> NzHandlerStats
+
+    def register(self, name: str, route: str, handler):
+        if route not in self.routes:
+            raise ValueError(f"Unknown route {route!r}, expected one of {ROUTES}")
+        self.routes[route][name] = handler
+        self.stats.setdefault(name, NzHandlerStats())
+
+    def unregister(self, name: str):
+        for handlers in self.routes.values():
+            handlers.pop(name, None)
+
+    def classify(self, message):
+        routes = ["all"]
+        if message.guild is None:
+            routes.append("dm")
+        # one snapshot for the whole message, settings can be swapped meanwhile
+        settings = self.bot.settings.index
+        guild_id = message.guild.id if message.guild else None
+        channel_id = message.channel.id
+        if settings.in_set("brainrot", channel_id) and settings.enabled(guild_id, "eggs"):
+            routes.append("brainrot")
+        if channel_id in self.bot.sticky_db.cache and settings.enabled(guild_id, "sticky"):
+            routes.append("sticky")
+        return routes
+
+    def dispatch(self, message):
+        if message.author.bot:
+            return
+        for route in self.classify(message):
+            for name, handler in self.routes[route].items():
+                asyncio.create_task(self._run(name, handler, message), name=f"nz-dispatch:{name}")
+
+    async def _run(self, name, handler, message):
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            await handler(message)
+        except Exception:
+            status = "error"
+            self.stats[name].errors += 1
+            await self.bot.on_error(f"on_message:{name}", message)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats[name].record(elapsed)
+            self.bot.metrics.observe("nazareth_listener_seconds", (name, status), elapsed)
@@ -0,0 +1,94 @@
+import asyncio
+import sqlite3
+
+
+class NzDmArchive:
+    """Every relayed DM line, full text searchable through an FTS5 table.
+
+    Lines are buffered and inserted in batches, every `interval` seconds or
+    once `batch_size` lines are waiting, so DMs never wait on the database.
+    """
+
+    def __init__(self, pool, batch_size=500, interval=5.0):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = []  # (content, author, user_id, ts)
+        self._flush_lock = asyncio.Lock()
+        self._kicked = None
+        self._timer = None
+
+    async def init_table(self):
+        async with self.pool.write() as db:
+            await db.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS DmArchive USING fts5(
+                    content,
+                    author UNINDEXED,
+                    user_id UNINDEXED,
+                    ts UNINDEXED
+                )
+            """)
+
+    async def start(self):
+        await self.init_table()
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_every())
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+    def add(self, user_id: int, author: str, ts: str, content: str):
+        self.pending.append((content, author, user_id, ts))
+        if len(self.pending) >= self.batch_size and (self._kicked is None or self._kicked.done()):
+            self._kicked = asyncio.create_task(self._flush_quietly())
+
+    async def _flush_every(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._flush_quietly()
+
+    async def _flush_quietly(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"DM archive flush failed: {e}")
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.pending:
+                return 0
+            batch, self.pending = self.pending, []
+            try:
+                await self.pool.executemany(
+                    "INSERT INTO DmArchive(content, author, user_id, ts) VALUES (?, ?, ?, ?)",
+                    batch
+                )
+            except BaseException:
+                self.pending[:0] = batch
+                raise
+            return len(batch)
+
+    async def search(self, query: str, limit: int = 10, offset: int = 0):
+        """(total hits, [(user_id, author, ts, snippet)]) best match first.
+
+        query is FTS5 syntax, if that doesn't parse it's searched as a plain phrase.
+        """
+        try:
+            return await self._search(query, limit, offset)
+        except sqlite3.OperationalError:
+            phrase = '"' + query.replace('"', '""') + '"'
+            return await self._search(phrase, limit, offset)
+
+    async def _search(self, query, limit, offset):
+        total = await self.pool.fetchone(
+            "SELECT count(*) FROM DmArchive WHERE DmArchive MATCH ?", (query,)
+        )
+        rows = await self.pool.fetchall("""
+            SELECT user_id, author, ts, snippet(DmArchive, 0, '**', '**', '...', 16)
+            FROM DmArchive WHERE DmArchive MATCH ?
+            ORDER BY rank LIMIT ? OFFSET ?
+        """, (query, limit, offset))
+        return total[0], rows
@@ -0,0 +1,102 @@
+from nz_matcher import NzKeywordMatcher
+
+GLOBAL_SCOPE = 0
+
+
+class NzEggStore:
+    """Easter eggs in sqlite, one basket and one compiled matcher per scope.
+
+    A scope is 0 for the global eggs, or a guild id or channel id (snowflakes
+    never collide). A message is matched against the global, guild and channel
+    matchers and the most specific scope wins a trigger, so every scope only
+    holds its own triggers instead of a merged copy of everything.
+    Matchers are rebuilt by the edit methods, for the edited scope only.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.baskets = {}   # scope_id -> {trigger: [responses]}
+        self.matchers = {}  # scope_id -> NzKeywordMatcher
+        self.loaded = False
+
+    async def init_table(self):
+        async with self.pool.write() as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS EasterEggs (
+                    scope_id INTEGER NOT NULL,
+                    trigger TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    PRIMARY KEY (scope_id, trigger, response)
+                )
+            """)
+
+    async def load(self, defaults=None):
+        """Load every basket, seeding the global one from defaults on first run"""
+        await self.init_table()
+        rows = await self.pool.fetchall("SELECT scope_id, trigger, response FROM EasterEggs")
+        if not rows and defaults:
+            rows = [
+                (GLOBAL_SCOPE, trigger.lower(), response)
+                for trigger, responses in defaults.items()
+                for response in (responses if isinstance(responses, list) else [responses])
+            ]
+            await self.pool.executemany(
+                "INSERT OR IGNORE INTO EasterEggs(scope_id, trigger, response) VALUES (?, ?, ?)",
+                rows
+            )
+        baskets = {}
+        for scope_id, trigger, response in rows:
+            baskets.setdefault(scope_id, {}).setdefault(trigger, []).append(response)
+        self.baskets = baskets
+        self.matchers = {scope_id: NzKeywordMatcher(basket) for scope_id, basket in baskets.items()}
+        self.loaded = True
+
+    def _rebuild(self, scope_id):
+        basket = self.baskets.get(scope_id)
+        if basket:
+            self.matchers[scope_id] = NzKeywordMatcher(basket)
+        else:
+            self.baskets.pop(scope_id, None)
+            self.matchers.pop(scope_id, None)
+
+    async def add_egg(self, scope_id: int, trigger: str, response: str):
+        trigger = trigger.lower()
+        await self.pool.execute(
+            "INSERT OR IGNORE INTO EasterEggs(scope_id, trigger, response) VALUES (?, ?, ?)",
+            (scope_id, trigger, response)
+        )
+        responses = self.baskets.setdefault(scope_id, {}).setdefault(trigger, [])
+        if response not in responses:
+            responses.append(response)
+        # a new response for a known trigger doesn't change the automaton
+        if len(responses) == 1:
+            self._rebuild(scope_id)
+
+    async def remove_egg(self, scope_id: int, trigger: str):
+        """Drops a trigger and all its responses, returns how many there were"""
+        trigger = trigger.lower()
+        basket = self.baskets.get(scope_id, {})
+        if trigger not in basket:
+            return 0
+        await self.pool.execute(
+            "DELETE FROM EasterEggs WHERE scope_id=? AND trigger=?",
+            (scope_id, trigger)
+        )
+        removed = len(basket.pop(trigger))
+        self._rebuild(scope_id)
+        return removed
+
+    def find(self, text, *scopes):
+        """trigger -> responses for every egg in text (text already lowercased).
+
+        scopes go from least to most specific, the global scope is implied.
+        """
+        found = {}
+        for scope_id in (GLOBAL_SCOPE, *scopes):
+            matcher = self.matchers.get(scope_id)
+            if matcher is None:
+                continue
+            basket = self.baskets[scope_id]
+            for trigger in matcher.find(text):
+                found[trigger] = basket[trigger]
+        return found
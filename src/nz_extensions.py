@@ -0,0 +1,150 @@
+import ast
+import hashlib
+import os
+
+
+class NzExtension:
+    """What we can tell about an extension from its source, without importing it.
+
+    requires - module level `requires = ("cogs.x", ...)`, loaded first
+    commands - top level command and group names (and aliases), so a deferred
+               extension knows which invocations should load it
+    intents, member_cache, message_cache - module level `required_intents`,
+               `member_cache` (MemberCacheFlags names) and `message_cache`
+               (messages kept), all the lean cache profile keeps around
+    error    - why the source couldn't be read, the extension is skipped rather
+               than taking the others down with it
+    """
+    __slots__ = ("name", "path", "requires", "commands", "intents", "member_cache", "message_cache", "error")
+
+    def __init__(self, name, path, requires=(), commands=(), intents=(), member_cache=(), message_cache=0,
+                 error=None):
+        self.name = name
+        self.path = path
+        self.requires = tuple(requires)
+        self.commands = tuple(commands)
+        self.intents = tuple(intents)
+        self.member_cache = tuple(member_cache)
+        self.message_cache = message_cache
+        self.error = error
+
+
+def _top_level_commands(tree):
+    names = []
+    for cls in (node for node in tree.body if isinstance(node, ast.ClassDef)):
+        for fn in cls.body:
+            if not isinstance(fn, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            for deco in fn.decorator_list:
+                # @commands.command(...) / @commands.group(...), not @somegroup.command(...)
+                if not (isinstance(deco, ast.Call) and isinstance(deco.func, ast.Attribute)):
+                    continue
+                owner = deco.func.value
+                if deco.func.attr not in ("command", "group") or not (isinstance(owner, ast.Name) and owner.id == "commands"):
+                    continue
+                kwargs = {kw.arg: kw.value for kw in deco.keywords}
+                name = fn.name
+                if "name" in kwargs:
+                    name = ast.literal_eval(kwargs["name"])
+                elif deco.args:
+                    name = ast.literal_eval(deco.args[0])
+                names.append(name)
+                if "aliases" in kwargs:
+                    names.extend(ast.literal_eval(kwargs["aliases"]))
+    return names
+
+
+# module level name -> NzExtension field
+DECLARATIONS = {
+    "requires": "requires",
+    "required_intents": "intents",
+    "member_cache": "member_cache",
+    "message_cache": "message_cache",
+}
+
+
+def inspect_extension(name, path):
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    try:
+        tree = ast.parse(source, path)
+        declared = {}
+        for node in tree.body:
+            if not isinstance(node, ast.Assign):
+                continue
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id in DECLARATIONS:
+                    declared[DECLARATIONS[target.id]] = ast.literal_eval(node.value)
+        return NzExtension(name, path, commands=_top_level_commands(tree), **declared)
+    except (SyntaxError, ValueError) as e:
+        # a syntax error, or a declaration that isn't a plain literal, reported
+        # (and skipped) by load_levels like any other extension that can't load
+        return NzExtension(name, path, error=f"can't read its source: {e}")
+
+
+def scan(folders):
+    """name -> path for every extension module in folders"""
+    found = {}
+    for folder in folders:
+        for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+            if entry.is_file() and entry.name.endswith(".py") and not entry.name.startswith("_"):
+                found[f"{folder}.{entry.name[:-3]}"] = entry.path
+    return found
+
+
+def discover(folders):
+    """name -> NzExtension for every extension module in folders"""
+    return {name: inspect_extension(name, path) for name, path in scan(folders).items()}
+
+
+def fingerprint(path, previous=None):
+    """(mtime_ns, size, sha1) of a source file.
+
+    Only hashes when mtime or size moved since previous, so polling an
+    untouched tree is a stat per file. Compare the hashes to tell whether it
+    changed, a save without edits gets a new mtime but the same hash.
+    """
+    st = os.stat(path)
+    if previous is not None and previous[:2] == (st.st_mtime_ns, st.st_size):
+        return previous
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    return (st.st_mtime_ns, st.st_size, digest)
+
+
+def load_levels(extensions):
+    """Extensions grouped so each group only requires earlier groups.
+
+    Returns (levels, broken) where broken maps an extension that can't be
+    loaded to the reason, unreadable source, a missing requirement or a cycle.
+    """
+    broken = {}
+    pending = {}
+    for name, ext in extensions.items():
+        missing = [req for req in ext.requires if req not in extensions]
+        if ext.error is not None:
+            broken[name] = ext.error
+        elif missing:
+            broken[name] = f"requires {', '.join(missing)} which doesn't exist"
+        else:
+            pending[name] = set(ext.requires)
+
+    levels = []
+    done = set()
+    while pending:
+        ready = sorted(name for name, reqs in pending.items() if reqs <= done)
+        if not ready:
+            blocked = {name: reqs & set(broken) for name, reqs in pending.items() if reqs & set(broken)}
+            if not blocked:
+                for name in pending:
+                    broken[name] = "circular requirement"
+                break
+            for name, reqs in blocked.items():
+                broken[name] = f"requires {', '.join(sorted(reqs))} which can't be loaded"
+                del pending[name]
+            continue
+        levels.append(ready)
+        done.update(ready)
+        for name in ready:
+            del pending[name]
+    return levels, broken
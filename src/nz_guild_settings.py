@@ -0,0 +1,187 @@
+import config
+
+# features a guild can switch off, cogs name theirs with a `feature` class attribute
+FEATURES = ("eggs", "sticky", "creds", "verify", "pin")
+# named sets of channels a feature is limited to
+CHANNEL_SETS = ("brainrot",)
+EMPTY = frozenset()
+
+
+class NzSettingsIndex:
+    """Every guild's settings, read on each message.
+
+    Never edited in place: a change builds a new index and the store swaps it
+    in with one assignment, so whoever grabbed the old one keeps a consistent
+    view and readers need no lock.
+    """
+    __slots__ = ("channels", "disabled", "prefixes")
+
+    def __init__(self, channels=None, disabled=None, prefixes=None):
+        self.channels = channels or {}  # channel set -> frozenset of channel ids
+        self.disabled = disabled or {}  # guild_id -> frozenset of disabled features
+        self.prefixes = prefixes or {}  # guild_id -> prefix, when not the default
+
+    def in_set(self, name: str, channel_id: int):
+        return channel_id in self.channels.get(name, EMPTY)
+
+    def enabled(self, guild_id: int, feature: str):
+        return feature not in self.disabled.get(guild_id, EMPTY)
+
+    def prefix(self, guild_id: int):
+        return self.prefixes.get(guild_id, config.prefix)
+
+
+class NzGuildSettings:
+    """Per-guild settings in sqlite, read through bot.settings.index.
+
+    Lives on the bot (bot.settings). The edit methods write the row first and
+    then swap in a new index, a failed write leaves the settings as they were.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.index = NzSettingsIndex()
+        self.loaded = False
+
+    async def init_tables(self):
+        async with self.pool.write() as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS GuildSettings (
+                    guild_id INTEGER PRIMARY KEY,
+                    prefix TEXT
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS GuildFeatures (
+                    guild_id INTEGER NOT NULL,
+                    feature TEXT NOT NULL,
+                    PRIMARY KEY (guild_id, feature)
+                )
+            """)
+            # guild_id is 0 for channels seeded from config, we didn't know it then
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS GuildChannels (
+                    channel_set TEXT NOT NULL,
+                    channel_id INTEGER NOT NULL,
+                    guild_id INTEGER NOT NULL,
+                    PRIMARY KEY (channel_set, channel_id)
+                )
+            """)
+            # what's been seeded from config, so it's only ever seeded once
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS SettingsSeeds (
+                    name TEXT PRIMARY KEY
+                )
+            """)
+
+    async def load(self, brainrot_channels=None):
+        """Builds the index, seeding the brainrot channels from config on first run"""
+        await self.init_tables()
+        await self.seed("brainrot", brainrot_channels or ())
+        channel_rows = await self.pool.fetchall("SELECT channel_set, channel_id FROM GuildChannels")
+        feature_rows = await self.pool.fetchall("SELECT guild_id, feature FROM GuildFeatures")
+        prefix_rows = await self.pool.fetchall(
+            "SELECT guild_id, prefix FROM GuildSettings WHERE prefix IS NOT NULL"
+        )
+
+        channels = {}
+        for name, channel_id in channel_rows:
+            channels.setdefault(name, set()).add(channel_id)
+        disabled = {}
+        for guild_id, feature in feature_rows:
+            disabled.setdefault(guild_id, set()).add(feature)
+        self.index = NzSettingsIndex(
+            {name: frozenset(ids) for name, ids in channels.items()},
+            {guild_id: frozenset(features) for guild_id, features in disabled.items()},
+            dict(prefix_rows)
+        )
+        self.loaded = True
+
+    async def seed(self, name: str, channel_ids):
+        """Copies a channel set from config the first time, never again.
+
+        Whether the table is empty says nothing once an admin has removed every
+        channel, so the seed is marked done in the same transaction. A database
+        from before the marker that already has channels counts as seeded.
+        """
+        async with self.pool.write() as db:
+            async with db.execute("SELECT 1 FROM SettingsSeeds WHERE name = ?", (name,)) as cursor:
+                if await cursor.fetchone() is not None:
+                    return
+            async with db.execute("SELECT 1 FROM GuildChannels WHERE channel_set = ? LIMIT 1", (name,)) as cursor:
+                seeded = await cursor.fetchone() is not None
+            if not seeded:
+                await db.executemany(
+                    "INSERT OR IGNORE INTO GuildChannels(channel_set, channel_id, guild_id) VALUES (?, ?, 0)",
+                    [(name, channel_id) for channel_id in channel_ids]
+                )
+            await db.execute("INSERT INTO SettingsSeeds(name) VALUES (?)", (name,))
+
+    def _swap(self, **changes):
+        old = self.index
+        self.index = NzSettingsIndex(
+            changes.get("channels", old.channels),
+            changes.get("disabled", old.disabled),
+            changes.get("prefixes", old.prefixes)
+        )
+
+    async def set_channel(self, name: str, guild_id: int, channel_id: int, enabled: bool):
+        if name not in CHANNEL_SETS:
+            raise ValueError(f"Unknown channel set {name!r}, expected one of {CHANNEL_SETS}")
+        if enabled:
+            await self.pool.execute(
+                """
+                INSERT INTO GuildChannels(channel_set, channel_id, guild_id)
+                VALUES (?, ?, ?)
+                ON CONFLICT(channel_set, channel_id) DO UPDATE SET guild_id=excluded.guild_id
+                """,
+                (name, channel_id, guild_id)
+            )
+        else:
+            await self.pool.execute(
+                "DELETE FROM GuildChannels WHERE channel_set = ? AND channel_id = ?",
+                (name, channel_id)
+            )
+        channels = dict(self.index.channels)
+        ids = channels.get(name, EMPTY)
+        channels[name] = ids | {channel_id} if enabled else ids - {channel_id}
+        self._swap(channels=channels)
+
+    async def set_feature(self, guild_id: int, feature: str, enabled: bool):
+        if feature not in FEATURES:
+            raise ValueError(f"Unknown feature {feature!r}, expected one of {FEATURES}")
+        if enabled:
+            await self.pool.execute(
+                "DELETE FROM GuildFeatures WHERE guild_id = ? AND feature = ?",
+                (guild_id, feature)
+            )
+        else:
+            await self.pool.execute(
+                "INSERT OR IGNORE INTO GuildFeatures(guild_id, feature) VALUES (?, ?)",
+                (guild_id, feature)
+            )
+        disabled = dict(self.index.disabled)
+        features = disabled.get(guild_id, EMPTY)
+        features = features - {feature} if enabled else features | {feature}
+        if features:
+            disabled[guild_id] = features
+        else:
+            disabled.pop(guild_id, None)
+        self._swap(disabled=disabled)
+
+    async def set_prefix(self, guild_id: int, prefix: str = None):
+        """None goes back to config.prefix"""
+        await self.pool.execute(
+            """
+            INSERT INTO GuildSettings(guild_id, prefix)
+            VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET prefix=excluded.prefix
+            """,
+            (guild_id, prefix)
+        )
+        prefixes = dict(self.index.prefixes)
+        if prefix is None:
+            prefixes.pop(guild_id, None)
+        else:
+            prefixes[guild_id] = prefix
+        self._swap(prefixes=prefixes)
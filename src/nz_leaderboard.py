@@ -0,0 +1,45 @@
+from bisect import bisect_left, insort
+
+
+class NzLeaderboard:
+    """SocialCredits ranking, kept sorted in memory and updated in place.
+
+    Entries are (-credits, user_id) in a sorted list, so a rank is one bisect
+    and top n is a slice. Moving a user is a bisect plus a list insert/delete,
+    which is a memmove and stays cheap well into the hundreds of thousands.
+    Users with the same credits share a rank.
+    """
+
+    def __init__(self):
+        self.credits = {}  # user_id -> credits
+        self._keys = []
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._keys)
+
+    def load(self, rows):
+        self.credits = {user_id: credits for user_id, credits in rows}
+        self._keys = sorted((-credits, user_id) for user_id, credits in self.credits.items())
+        self.loaded = True
+
+    def set(self, user_id: int, credits: int):
+        old = self.credits.get(user_id)
+        if old is not None:
+            if old == credits:
+                return
+            del self._keys[bisect_left(self._keys, (-old, user_id))]
+        self.credits[user_id] = credits
+        insort(self._keys, (-credits, user_id))
+
+    def add(self, user_id: int, amount: int):
+        self.set(user_id, self.credits.get(user_id, 0) + amount)
+
+    def rank(self, user_id: int):
+        credits = self.credits.get(user_id)
+        if credits is None:
+            return None
+        return bisect_left(self._keys, (-credits,)) + 1
+
+    def top(self, limit=10, offset=0):
+        return [(user_id, -neg) for neg, user_id in self._keys[offset:offset + limit]]
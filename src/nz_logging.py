@@ -0,0 +1,142 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+# everything a LogRecord carries by itself, the rest came in through extra=
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+def to_json(record):
+    entry = {
+        "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+        "level": record.levelname,
+        "logger": record.name,
+        "msg": record.getMessage(),
+    }
+    for key, value in record.__dict__.items():
+        if key not in _RECORD_ATTRS:
+            entry[key] = value
+    return json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+
+
+class NzSampleFilter(logging.Filter):
+    """Lets through roughly `rate` of the records, 1.0 keeps all of them"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class NzQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the event loop: a full queue drops the record and counts it"""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class NzLogWriter(threading.Thread):
+    """Drains the log queue on its own thread, batch by batch.
+
+    Each batch is one write (and one flush) of JSON lines to a rotating file.
+    Records at console_level or above are also printed, plain.
+    """
+
+    def __init__(self, q, path, max_bytes, backups, batch_size, flush_interval, console_level):
+        super().__init__(name="nz-log-writer", daemon=True)
+        self.queue = q
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.console_level = console_level
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # only used for its file handling and rollover, we write to its stream ourselves
+        self.file = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+        self._sentinel = object()
+
+    def stop(self):
+        self.queue.put(self._sentinel)
+        self.join()
+        self.file.close()
+
+    def run(self):
+        done = False
+        while not done:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            while True:
+                if record is self._sentinel:
+                    done = True
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        try:
+            if self.file.stream is None:
+                self.file.stream = self.file._open()
+            self.file.stream.write("".join(to_json(r) for r in batch))
+            self.file.stream.flush()
+            if self.file.maxBytes and self.file.stream.tell() >= self.file.maxBytes:
+                self.file.doRollover()
+            for r in batch:
+                if r.levelno >= self.console_level:
+                    print(f"[{r.levelname}] {r.name}: {r.getMessage()}", file=sys.stderr)
+        except Exception as e:
+            print(f"Log writer failed: {e}", file=sys.stderr)
+
+
+def setup_logging(path="logs/nazareth.jsonl", level="INFO", levels=None, max_bytes=10 * 1024 * 1024,
+                  backups=5, batch_size=256, flush_interval=1.0, queue_size=10000,
+                  console_level="WARNING", message_sample=1.0):
+    """Route the `nazareth` loggers through a queue to NzLogWriter, returns the writer"""
+    q = queue.Queue(maxsize=queue_size)
+    writer = NzLogWriter(q, path, max_bytes, backups, batch_size, flush_interval,
+                         logging.getLevelName(console_level))
+    handler = NzQueueHandler(q)
+    # QueueHandler.prepare formats before enqueueing, keep it to the bare message
+    handler.setFormatter(logging.Formatter("%(message)s"))
+
+    root = logging.getLogger("nazareth")
+    root.setLevel(level)
+    root.propagate = False
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(handler)
+    for name, lvl in (levels or {}).items():
+        logging.getLogger(name).setLevel(lvl)
+
+    messages = logging.getLogger("nazareth.messages")
+    for f in list(messages.filters):
+        messages.removeFilter(f)
+    if message_sample < 1.0:
+        messages.addFilter(NzSampleFilter(message_sample))
+
+    writer.start()
+    return writer
@@ -0,0 +1,69 @@
+# below this many keywords a plain `in` per keyword (which runs in C) beats
+# walking the automaton char by char in python, see bench/bench_matcher.py
+SCAN_LIMIT = 128
+
+
+class NzKeywordMatcher:
+    """Aho-Corasick automaton over a fixed set of keywords.
+
+    find() walks the text once and returns every keyword that occurs in it,
+    no matter how many keywords there are. Build a new matcher when the
+    keywords change, the automaton itself is immutable.
+    """
+
+    def __init__(self, keywords=(), scan_limit=SCAN_LIMIT):
+        self.keywords = frozenset(k for k in keywords if k)
+        self._scan = len(self.keywords) <= scan_limit
+        if self._scan:
+            self._goto = self._fail = self._out = None
+            return
+        goto = [{}]
+        out = [()]
+        for keyword in self.keywords:
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                state = nxt
+            out[state] = (keyword,)
+
+        # breadth first so a state's fail target is always finished before it
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(ch, 0)
+                fail[nxt] = target if target != nxt else 0
+                if out[fail[nxt]]:
+                    out[nxt] = out[nxt] + out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def find(self, text):
+        if self._scan:
+            return {k for k in self.keywords if k in text}
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for ch in text:
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            if out[state]:
+                found.update(out[state])
+        return found
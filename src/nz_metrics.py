@@ -0,0 +1,175 @@
+import time
+from bisect import bisect_left
+from functools import lru_cache
+import discord
+from aiohttp import web
+
+# seconds, from a cache hit to a slow REST call
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class NzHistogram:
+    """Fixed buckets, so an observation is a bisect and two adds"""
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimated like prometheus' histogram_quantile, linear within the bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(BUCKETS):
+                    return BUCKETS[-1]
+                low = BUCKETS[i - 1] if i else 0.0
+                return low + (BUCKETS[i] - low) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+
+class NzMetrics:
+    """Counters and latency histograms for the whole bot (bot.metrics).
+
+    Everything is keyed by metric name and a tuple of label values, the label
+    names are declared once. Gauges are callbacks read when the metrics are
+    rendered, so they cost nothing in between.
+    """
+
+    def __init__(self):
+        self.histograms = {}  # name -> {labels: NzHistogram}
+        self.counters = {}    # name -> {labels: int}
+        self.gauges = {}      # name -> callback
+        self.meta = {}        # name -> (help, label names)
+        self.histogram("nazareth_command_seconds", "Command run time", ("command", "status"))
+        self.histogram("nazareth_listener_seconds", "on_message handler run time", ("handler", "status"))
+        self.histogram("nazareth_db_query_seconds", "Database query time, waiting for a connection included", ("op", "table"))
+        self.histogram("nazareth_rest_seconds", "Discord REST call time", ("method", "route"))
+        self.counter("nazareth_rest_errors_total", "Discord REST calls that failed", ("method", "route", "status"))
+
+    def histogram(self, name, help, labels=()):
+        self.histograms.setdefault(name, {})
+        self.meta[name] = (help, tuple(labels))
+
+    def counter(self, name, help, labels=()):
+        self.counters.setdefault(name, {})
+        self.meta[name] = (help, tuple(labels))
+
+    def gauge(self, name, help, callback):
+        self.gauges[name] = callback
+        self.meta[name] = (help, ())
+
+    def observe(self, name, labels, value):
+        series = self.histograms[name]
+        hist = series.get(labels)
+        if hist is None:
+            hist = series[labels] = NzHistogram()
+        hist.observe(value)
+
+    def inc(self, name, labels=(), amount=1):
+        series = self.counters[name]
+        series[labels] = series.get(labels, 0) + amount
+
+    def render(self):
+        """Prometheus text exposition format"""
+        out = []
+        for name, series in self.counters.items():
+            help, label_names = self.meta[name]
+            out.append(f"# HELP {name} {help}\n# TYPE {name} counter\n")
+            for labels, value in series.items():
+                out.append(f"{name}{_labels(label_names, labels)} {value}\n")
+        for name, series in self.histograms.items():
+            help, label_names = self.meta[name]
+            out.append(f"# HELP {name} {help}\n# TYPE {name} histogram\n")
+            for labels, hist in series.items():
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ("+Inf",), hist.counts):
+                    cumulative += n
+                    le = _labels(label_names + ("le",), labels + (str(bound),))
+                    out.append(f"{name}_bucket{le} {cumulative}\n")
+                base = _labels(label_names, labels)
+                out.append(f"{name}_sum{base} {hist.sum}\n{name}_count{base} {hist.count}\n")
+        for name, callback in self.gauges.items():
+            try:
+                value = callback()
+            except Exception:
+                continue  # whatever it reads isn't up yet
+            out.append(f"# HELP {name} {self.meta[name][0]}\n# TYPE {name} gauge\n{name} {value}\n")
+        return "".join(out)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+@lru_cache(maxsize=512)
+def query_label(sql):
+    """("SELECT", "SocialCredits") for a statement, worked out once per distinct sql"""
+    words = sql.replace("(", " ").split()
+    verb = words[0].upper() if words else "?"
+    table = "?"
+    for i, word in enumerate(words):
+        if word.upper() in ("FROM", "INTO", "UPDATE", "TABLE"):
+            names = [w for w in words[i + 1:i + 5] if w.upper() not in ("IF", "NOT", "EXISTS")]
+            if names:
+                table = names[0]
+                break
+    return verb, table
+
+
+def instrument_http(http, metrics):
+    """Times every REST call discord.py makes, sends, edits and deletes included"""
+    request = http.request
+
+    async def timed_request(route, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await request(route, **kwargs)
+        except discord.HTTPException as e:
+            metrics.inc("nazareth_rest_errors_total", (route.method, route.path, str(e.status)))
+            raise
+        finally:
+            metrics.observe("nazareth_rest_seconds", (route.method, route.path), time.perf_counter() - start)
+
+    http.request = timed_request
+
+
+class NzMetricsServer:
+    """GET /metrics on a local port for prometheus to scrape"""
+
+    def __init__(self, metrics, host="127.0.0.1", port=9464):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def handle(self, request):
+        return web.Response(text=self.metrics.render(), content_type="text/plain", charset="utf-8")
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+import aiosqlite
+from nz_metrics import query_label
+
+# applied to every connection as it opens, in this order (journal_mode has to
+# go first, the rest of the settings are per connection anyway)
+# WAL lets the readers keep going while the writer commits, and with
+# synchronous=NORMAL a commit no longer fsyncs, only checkpoints do
+DEFAULT_PROFILE = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "busy_timeout": 5000,
+    "mmap_size": 128 * 1024 * 1024,
+    "cache_size": -8000,  # negative means KiB, so ~8MB per connection
+    "temp_store": "memory",
+}
+
+
+class NzPool:
+    """Long-lived sqlite connections shared by every database class.
+
+    One writer connection (writes are serialized behind a lock anyway, sqlite
+    only allows a single writer) and a small set of reader connections handed
+    out through a queue. Opening a connection per query costs a file handle and
+    a fresh aiosqlite worker thread, so we only ever do it here, once.
+    """
+
+    def __init__(self, path="nazareth.db", readers=4, profile=None,
+                 checkpoint_interval=300, optimize_interval=3600, metrics=None):
+        self.path = path
+        self.metrics = metrics  # NzMetrics, times every query that goes through the helpers below
+        self.reader_count = readers
+        self.profile = dict(DEFAULT_PROFILE)
+        if profile:
+            self.profile.update(profile)
+        self.checkpoint_interval = checkpoint_interval
+        self.optimize_interval = optimize_interval
+        self.writer = None
+        self.commits = 0  # transactions committed through the pool, see bench/replay.py
+        self._readers = asyncio.Queue()
+        self._write_lock = asyncio.Lock()
+        self._conns = []
+        self._maintenance = None
+
+    async def open(self):
+        if self.writer is not None:
+            return
+        self.writer = await self._connect()
+        for _ in range(self.reader_count):
+            self._readers.put_nowait(await self._connect())
+        if self.checkpoint_interval:
+            self._maintenance = asyncio.create_task(self._maintain())
+
+    async def close(self):
+        if self.writer is None:
+            return
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            self._maintenance = None
+        # wait for the in-flight write to finish before pulling the plug
+        async with self._write_lock:
+            try:
+                await self.writer.execute("PRAGMA optimize")
+                async with self.writer.execute("PRAGMA wal_checkpoint(TRUNCATE)"):
+                    pass
+            except aiosqlite.Error as e:
+                print(f"Final checkpoint failed: {e}")
+            for conn in self._conns:
+                await conn.close()
+            self._conns.clear()
+            self.writer = None
+            self._readers = asyncio.Queue()
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(self.path)
+        for pragma, value in self.profile.items():
+            if value is None:
+                continue
+            async with conn.execute(f"PRAGMA {pragma}={value}"):
+                pass
+        self._conns.append(conn)
+        return conn
+
+    async def checkpoint(self, mode="PASSIVE"):
+        # PASSIVE never waits on readers, it just copies whatever it can
+        async with self._write_lock:
+            async with self.writer.execute(f"PRAGMA wal_checkpoint({mode})") as cursor:
+                return await cursor.fetchone()
+
+    async def optimize(self):
+        async with self._write_lock:
+            await self.writer.execute("PRAGMA optimize")
+
+    async def _maintain(self):
+        since_optimize = 0
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self.checkpoint()
+                since_optimize += self.checkpoint_interval
+                if self.optimize_interval and since_optimize >= self.optimize_interval:
+                    await self.optimize()
+                    since_optimize = 0
+            except aiosqlite.Error as e:
+                print(f"Database maintenance failed: {e}")
+
+    @asynccontextmanager
+    async def read(self):
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self):
+        """Exclusive access to the writer, committed on exit and rolled back on error"""
+        async with self._write_lock:
+            try:
+                yield self.writer
+            except BaseException:
+                await self.writer.rollback()
+                raise
+            await self.commit()
+
+    async def commit(self):
+        """Commits the writer, for callers that already hold it through locked()"""
+        await self.writer.commit()
+        self.commits += 1
+
+    @asynccontextmanager
+    async def locked(self):
+        """The writer under the write lock, without a transaction.
+
+        For reads that have to line up with writes that are being flushed.
+        """
+        async with self._write_lock:
+            yield self.writer
+
+    def observe(self, label, start):
+        if self.metrics is not None:
+            self.metrics.observe("nazareth_db_query_seconds", label, time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def timed(self, sql):
+        """Times a block that queries the connections itself, like the helpers below do"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(query_label(sql), start)
+
+    # cursors are always closed here, a dangling cursor keeps its read lock
+    # alive and makes the writer wait on "database is locked"
+    async def fetchone(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            async with self.read() as db:
+                async with db.execute(sql, params) as cursor:
+                    return await cursor.fetchone()
+        finally:
+            self.observe(query_label(sql), start)
+
+    async def fetchall(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            async with self.read() as db:
+                async with db.execute(sql, params) as cursor:
+                    return await cursor.fetchall()
+        finally:
+            self.observe(query_label(sql), start)
+
+    async def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            async with self.write() as db:
+                await db.execute(sql, params)
+        finally:
+            self.observe(query_label(sql), start)
+
+    async def executemany(self, sql, seq):
+        start = time.perf_counter()
+        try:
+            async with self.write() as db:
+                await db.executemany(sql, seq)
+        finally:
+            self.observe(query_label(sql), start)
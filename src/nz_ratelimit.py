@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+
+SCOPES = {
+    "user": lambda message: message.author.id,
+    "channel": lambda message: message.channel.id,
+    # DMs have no guild, the channel stands in for it
+    "guild": lambda message: message.guild.id if message.guild else message.channel.id,
+}
+
+
+class NzRateLimiter:
+    """Token bucket per key: `rate` hits per `per` seconds, bursts up to `rate`.
+
+    Buckets sit in an OrderedDict in last-touched order. A bucket that has
+    refilled completely is indistinguishable from a missing one, so every
+    check drops full buckets off the cold end. A key can only be dropped as
+    often as it was added, so checks stay O(1) amortized. max_keys is a hard
+    cap on top of that.
+    """
+
+    def __init__(self, rate: int, per: float, scope="user", max_keys=10000):
+        self.capacity = float(rate)
+        self.refill = rate / per  # tokens per second
+        self.key = SCOPES[scope]
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, monotonic time of last update)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _tokens(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return self.capacity
+        tokens, stamp = bucket
+        return min(self.capacity, tokens + (now - stamp) * self.refill)
+
+    def _evict(self, now):
+        buckets = self._buckets
+        while buckets:
+            key, (tokens, stamp) = next(iter(buckets.items()))
+            if tokens + (now - stamp) * self.refill < self.capacity:
+                break
+            del buckets[key]
+
+    def buckets(self):
+        """A copy of the buckets, for handing over to a replacement limiter"""
+        return OrderedDict(self._buckets)
+
+    def restore(self, buckets):
+        # rate may have changed in between, nobody keeps more than a full bucket
+        for key, (tokens, stamp) in buckets.items():
+            self._buckets[key] = (min(tokens, self.capacity), stamp)
+
+    def hit(self, key, now=None):
+        """Take a token for key, False (and nothing taken) when there is none"""
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+        tokens = self._tokens(key, now)
+        if tokens < 1:
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return True
+
+    def allow(self, message):
+        return self.hit(self.key(message))
+
+    def retry_after(self, key, now=None):
+        """Seconds until key has a token again, 0 if it has one now"""
+        now = time.monotonic() if now is None else now
+        tokens = self._tokens(key, now)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.refill
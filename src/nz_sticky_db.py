@@ -0,0 +1,68 @@
+class NzStickyDb:
+    """The only way in and out of StickyChannels.
+
+    Lives on the bot (bot.sticky_db) and owns the runtime cache the sticky
+    cog and NzStickyHandler share:
+    channel_id -> {content, message_id, last_msg_id}
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.cache = {}
+        self.loaded = False
+
+    async def load(self):
+        # one query at startup, reconnects don't touch this again
+        self.cache = await self.get_sticky_channels()
+        self.loaded = True
+
+    async def add_channel(self, channel_id: int, content: str):
+        await self.pool.execute(
+            """
+            INSERT INTO StickyChannels(channel_id, content)
+            VALUES (?, ?)
+            ON CONFLICT(channel_id) DO UPDATE SET
+                content=excluded.content
+            """,
+            (channel_id, content)
+        )
+        # keep the ids of a sticky we're replacing so it still gets cleaned up
+        data = self.cache.get(channel_id)
+        if data is None:
+            self.cache[channel_id] = {"content": content, "message_id": None, "last_msg_id": None}
+        else:
+            data["content"] = content
+
+    async def remove_channel(self, channel_id: int):
+        """Returns the cached data of the removed channel, if there was any"""
+        await self.pool.execute(
+            "DELETE FROM StickyChannels WHERE channel_id = ?",
+            (channel_id,)
+        )
+        return self.cache.pop(channel_id, None)
+
+    async def set_message_id(self, channel_id: int, message_id: int):
+        await self.pool.execute(
+            "UPDATE StickyChannels SET message_id=? WHERE channel_id=?",
+            (message_id, channel_id)
+        )
+
+    async def set_message_ids(self, rows):
+        """rows of (message_id, channel_id), all in one transaction"""
+        if not rows:
+            return
+        await self.pool.executemany(
+            "UPDATE StickyChannels SET message_id=? WHERE channel_id=?",
+            rows
+        )
+
+    async def get_sticky_channels(self):
+        rows = await self.pool.fetchall(
+            "SELECT channel_id, content, message_id FROM StickyChannels"
+        )
+        # the checkpointed id is the sticky still up from before the restart,
+        # the next repost deletes it like any other
+        return {
+            row[0]: {"content": row[1], "message_id": row[2], "last_msg_id": row[2]}
+            for row in rows
+        }
@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+CREDITS_SQL = """
+    INSERT INTO SocialCredits(user_id, credits)
+    VALUES (?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET credits = credits + excluded.credits
+"""
+PROFILE_SQL = """
+    INSERT INTO SocialCredits(user_id, profile)
+    VALUES (?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET profile=excluded.profile
+"""
+TAXES_SQL = """
+    INSERT INTO SocialCredits(user_id, taxes)
+    VALUES (?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET taxes=excluded.taxes
+"""
+VERIFICATION_SQL = """
+    INSERT INTO Verification(guild_id, user_id, verified)
+    VALUES (?, ?, ?)
+    ON CONFLICT(guild_id, user_id) DO UPDATE SET verified=excluded.verified
+"""
+
+
+class NzWriteBuffer:
+    """Write-behind buffer for the per-user upserts.
+
+    Pending writes are coalesced per key: credit deltas add up, profile, taxes
+    and verification are last write wins. Everything goes out in one
+    transaction once max_pending keys are dirty or every interval seconds.
+
+    The swap from pending to the flushed batch happens under the pool's write
+    lock, so a reader holding that lock sees either the committed rows or the
+    pending values, never neither.
+    """
+
+    def __init__(self, pool, max_pending=500, interval=2.0):
+        self.pool = pool
+        self.max_pending = max_pending
+        self.interval = interval
+        self.credits = {}       # user_id -> delta
+        self.profiles = {}      # user_id -> profile
+        self.taxes = {}         # user_id -> taxes
+        self.verification = {}  # (guild_id, user_id) -> verified
+        # the verification batch being committed, out of pending but not in the
+        # table yet, so readers (and the cache behind them) don't see the old row
+        self.flushing_verification = {}
+        self.flushes = 0
+        self._flush_lock = asyncio.Lock()
+        self._kicked = None
+        self._timer = None
+
+    def __len__(self):
+        return len(self.credits) + len(self.profiles) + len(self.taxes) + len(self.verification)
+
+    def start(self):
+        if self._timer is None and self.interval:
+            self._timer = asyncio.create_task(self._flush_every())
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+    # ===== buffering =====
+    def add_credits(self, user_id: int, amount: int):
+        self.credits[user_id] = self.credits.get(user_id, 0) + amount
+        self._check_size()
+
+    def set_profile(self, user_id: int, profile: str):
+        self.profiles[user_id] = profile
+        self._check_size()
+
+    def set_taxes(self, user_id: int, taxes: float):
+        self.taxes[user_id] = taxes
+        self._check_size()
+
+    def set_verification(self, guild_id: int, user_id: int, verified: int):
+        self.verification[(guild_id, user_id)] = verified
+        self._check_size()
+
+    def _check_size(self):
+        if not self.interval:
+            # no timer, flush right away (whatever piles up meanwhile shares the commit)
+            self._kick()
+        elif len(self) >= self.max_pending:
+            self._kick()
+
+    def _kick(self):
+        if self._kicked is None or self._kicked.done():
+            self._kicked = asyncio.create_task(self._flush_quietly())
+
+    # ===== flushing =====
+    async def _flush_every(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._flush_quietly()
+
+    async def _flush_quietly(self):
+        # background flushes keep their batch pending on failure and retry later
+        try:
+            await self.flush()
+            # without a timer nothing else picks up what came in mid-flush
+            while not self.interval and len(self):
+                await self.flush()
+        except Exception as e:
+            print(f"Write-behind flush failed: {e}")
+
+    async def flush(self):
+        async with self._flush_lock:
+            async with self.pool.locked() as db:
+                if not len(self):
+                    return 0
+                start = time.perf_counter()
+                credits, self.credits = self.credits, {}
+                profiles, self.profiles = self.profiles, {}
+                taxes, self.taxes = self.taxes, {}
+                verification, self.verification = self.verification, {}
+                self.flushing_verification = verification
+                try:
+                    if credits:
+                        await db.executemany(CREDITS_SQL, credits.items())
+                    if profiles:
+                        await db.executemany(PROFILE_SQL, profiles.items())
+                    if taxes:
+                        await db.executemany(TAXES_SQL, taxes.items())
+                    if verification:
+                        await db.executemany(
+                            VERIFICATION_SQL,
+                            ((g, u, v) for (g, u), v in verification.items())
+                        )
+                    await self.pool.commit()
+                except BaseException:
+                    await db.rollback()
+                    self._restore(credits, profiles, taxes, verification)
+                    raise
+                finally:
+                    self.flushing_verification = {}
+                self.pool.observe(("FLUSH", "WriteBuffer"), start)
+            self.flushes += 1
+            return len(credits) + len(profiles) + len(taxes) + len(verification)
+
+    def _restore(self, credits, profiles, taxes, verification):
+        # put the failed batch back without clobbering anything newer
+        for user_id, delta in credits.items():
+            self.credits[user_id] = self.credits.get(user_id, 0) + delta
+        for pending, failed in ((self.profiles, profiles), (self.taxes, taxes),
+                                (self.verification, verification)):
+            for key, value in failed.items():
+                pending.setdefault(key, value)